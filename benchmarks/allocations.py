@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks.allocations
+----------------------
+
+Measures the memory blocks allocated by the html, plain and indent
+parsers, their peak memory, the garbage collections triggered while
+parsing and the cyclic garbage left behind by the parsed trees.
+
+Run with `python benchmarks/allocations.py`.
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from renoir import Renoir
+
+
+BLOCK = """<div class="item">
+    {{block item}}
+    <h2>{{=title}}</h2>
+    {{for idx, value in enumerate(values):}}
+        <p class="row-{{=idx}}">{{=value}}</p>
+    {{pass}}
+    {{end}}
+</div>
+"""
+
+
+def collections():
+    return sum(stats["collections"] for stats in gc.get_stats())
+
+
+def bench(label, templater, source):
+    gc.collect()
+    start_collections = collections()
+    tracemalloc.start()
+    start = time.perf_counter()
+    parser = templater._build_parser("bench.html", source, {})
+    parser.render()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    #: blocks allocated by parsing and still alive along with the parser
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+    tracemalloc.stop()
+    parse_collections = collections() - start_collections
+    del parser
+    garbage = gc.collect()
+    print(
+        f"{label:<8} {elapsed * 1e3:>9.2f} ms {blocks:>8} blocks {peak / 1024:>10.1f} KiB peak "
+        f"{parse_collections:>5} gc runs {garbage:>7} cyclic objects"
+    )
+
+
+def main():
+    source = BLOCK * 500
+    for label, kwargs in (
+        ("html", {"mode": "html"}),
+        ("plain", {"mode": "plain"}),
+        ("indent", {"mode": "html", "adjust_indent": True}),
+    ):
+        bench(label, Renoir(**kwargs), source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks.codegen
+------------------
+
+Compares rendering with and without write fusion in generated code,
+and encoding the rendered text against the bytes output mode.
+
+Run with `python benchmarks/codegen.py`.
+"""
+
+import os
+import sys
+import timeit
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from renoir import Renoir
+from renoir.parsing import parsers
+
+
+TEMPLATE = """<table>
+{{for row in rows:}}
+<tr>{{for a, b in row:}}<td>{{=a}}</td><td>{{=b}}</td>{{pass}}</tr>
+{{pass}}
+</table>"""
+
+
+class NoFusion(parsers.WriterFuser):
+    def visit(self, nodes):
+        return nodes
+
+
+def bench(label, stmt, number):
+    best = min(timeit.repeat(stmt, number=number, repeat=5))
+    print(f"{label:<40} {best / number * 1e6:>10.2f} us")
+
+
+def main():
+    rows = [[(f"cell {row}", f"<{col}>") for col in range(10)] for row in range(100)]
+    fuser = parsers.WriterFuser
+    for label, fuser_cls in (("unfused writes", NoFusion), ("fused writes", fuser)):
+        parsers.WriterFuser = fuser_cls
+        templater = Renoir(mode="html")
+        templater._render(TEMPLATE, label, {"rows": rows})
+        bench(
+            f"{label}: table 100x10",
+            lambda templater=templater, label=label: templater._render(TEMPLATE, label, {"rows": rows}),
+            200,
+        )
+    parsers.WriterFuser = fuser
+    templater = Renoir(mode="html")
+    bench("str output + encode", lambda: templater._render(TEMPLATE, "str", {"rows": rows}).encode("utf8"), 200)
+    templater = Renoir(mode="html", output="bytes")
+    bench("bytes output", lambda: templater._render(TEMPLATE, "bytes", {"rows": rows}), 200)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks.escape
+-----------------
+
+Compares the writers escaping against the former `html.escape` based one.
+
+Run with `python benchmarks/escape.py`.
+"""
+
+import html
+import os
+import sys
+import timeit
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from renoir import SafeString
+from renoir._shortcuts import to_bytes, to_str, to_unicode
+from renoir.writers import EscapeAllWriter, Writer
+
+
+def legacy_htmlescape(obj):
+    if hasattr(obj, "__html__"):
+        return obj.__html__()
+    return html.escape(to_str(obj), True).replace("'", "&#39;")
+
+
+def legacy_escape(data, escape_all=False):
+    body = None
+    if hasattr(data, "__html__"):
+        try:
+            body = data.__html__()
+        except Exception:
+            pass
+    if body is None:
+        body = legacy_htmlescape(data if isinstance(data, str) else to_unicode(data))
+        if escape_all:
+            body = to_bytes(body, "ascii", "xmlcharrefreplace")
+    return body if isinstance(body, str) else to_unicode(body)
+
+
+VALUES = {
+    "short text": "cell 12",
+    "long text": "A reasonably long paragraph of text without any special character in it. " * 4,
+    "markup": '<b>Fish & Chips</b> for "everyone"',
+    "int": 12345,
+    "float": 3.14159,
+    "none": None,
+    "safe string": SafeString("<b>bold</b>"),
+}
+
+
+def bench(label, stmt, number=200000):
+    best = min(timeit.repeat(stmt, number=number, repeat=5))
+    print(f"{label:<40} {best / number * 1e9:>10.1f} ns")
+
+
+def main():
+    writer, writer_all = Writer(), EscapeAllWriter()
+    for name, value in VALUES.items():
+        bench(f"legacy: {name}", lambda value=value: legacy_escape(value))
+        bench(f"writer: {name}", lambda value=value: writer.html(value))
+    for name, value in (("ascii text", "cell 12"), ("non-ascii text", "nuvolosità variabile")):
+        bench(f"legacy escape all: {name}", lambda value=value: legacy_escape(value, True))
+        bench(f"writer escape all: {name}", lambda value=value: writer_all.html(value))
+
+
+if __name__ == "__main__":
+    main()
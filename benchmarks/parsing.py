@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks.parsing
+------------------
+
+Measures templates parsing time against the number of tags, which
+should grow linearly.
+
+Run with `python benchmarks/parsing.py [tags ...]`.
+"""
+
+import os
+import sys
+import time
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from renoir import Renoir
+
+
+def make_source(tags):
+    #: every line holds 4 tags
+    return "<p>{{=a}} <b>{{=b}}</b></p>\n{{if a:}}<i>x</i>{{pass}}\n" * (tags // 4)
+
+
+def bench(templater, tags):
+    source = make_source(tags)
+    start = time.perf_counter()
+    templater._build_parser("bench.html", source, {}).render()
+    elapsed = time.perf_counter() - start
+    print(f"{tags:>9} tags {elapsed:>10.3f} s {elapsed / tags * 1e6:>8.2f} us/tag")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    templater = Renoir(mode="html")
+    for tags in sizes:
+        bench(templater, tags)
+
+
+if __name__ == "__main__":
+    main()
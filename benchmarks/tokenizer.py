@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks.tokenizer
+--------------------
+
+Compares the tokenizer, which stops the tags regex split at the last closing
+delimiter, against splitting the whole source with the regex, on
+regular templates and on sources full of unterminated tags.
+
+Run with `python benchmarks/tokenizer.py`.
+"""
+
+import os
+import sys
+import time
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from renoir.parsing.tokenizer import get_tokenizer
+
+
+SOURCES = {
+    "regular": "<p>{{=a}} <b>{{=b}}</b></p>\n{{if a:}}<i>x</i>{{pass}}\n",
+    "unterminated": "<p>{{ a\n",
+}
+
+
+def bench(label, func, source, max_time=1):
+    start = time.perf_counter()
+    func(source)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36} {elapsed * 1e3:>10.2f} ms")
+    return elapsed < max_time
+
+
+def main():
+    tokenizer = get_tokenizer(("{{", "}}"))
+    for name, chunk in SOURCES.items():
+        run_regex = True
+        for repeat in [1_000, 10_000, 100_000]:
+            source = chunk * repeat
+            if run_regex:
+                run_regex = bench(f"regex split: {name} x{repeat}", tokenizer.pattern.split, source)
+            else:
+                print(f"regex split: {name} x{repeat}".ljust(36), "skipped")
+            bench(f"tokenizer: {name} x{repeat}", tokenizer.tokenize, source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks.writers
+------------------
+
+Compares the default writer against the former `StringIO` based one.
+
+Run with `python benchmarks/writers.py`.
+"""
+
+import os
+import sys
+import timeit
+from io import StringIO
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from renoir import Renoir
+from renoir.writers import Writer
+
+
+class StringIOWriter(Writer):
+    __slots__ = ["buffer"]
+
+    def __init__(self, target=None):
+        self.buffer = StringIO()
+        self.body = []
+        self._push = self.buffer.write if target is None else target.write
+
+    def write(self, data):
+        self._push(self._to_unicode(data))
+
+    def getvalue(self):
+        return self.buffer.getvalue()
+
+    def reset(self):
+        self.buffer = StringIO()
+        self._push = self.buffer.write
+
+
+TEMPLATE = """<table>
+{{for row in rows:}}
+<tr>{{for cell in row:}}<td>{{=cell}}</td>{{pass}}</tr>
+{{pass}}
+</table>"""
+
+
+def bench(label, stmt, number):
+    best = min(timeit.repeat(stmt, number=number, repeat=5))
+    print(f"{label:<40} {best / number * 1e6:>10.2f} us")
+
+
+def main():
+    rows = [[f"cell <{row}:{col}>" for col in range(10)] for row in range(100)]
+    for label, writer_cls in (("StringIO writer", StringIOWriter), ("list writer + pool", Writer)):
+        templater = Renoir(writer=writer_cls)
+        bench(
+            f"{label}: table 100x10",
+            lambda templater=templater: templater._render(TEMPLATE, "<table>", {"rows": rows}),
+            200,
+        )
+        bench(
+            f"{label}: small page",
+            lambda templater=templater: templater._render("<p>{{=a}}</p>", "<small>", {"a": "foo"}),
+            20000,
+        )
+
+        def writes(writer_cls=writer_cls):
+            writer = writer_cls()
+            for _ in range(1000):
+                writer.write("<td>")
+                writer.escape("foo & bar")
+                writer.write("</td>")
+            return writer.getvalue()
+
+        bench(f"{label}: 3000 raw calls", writes, 500)
+
+
+if __name__ == "__main__":
+    main()
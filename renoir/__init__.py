@@ -1,3 +1,4 @@
 from .apis import Renoir
 from .extensions import Extension
 from .parsing.lexers import Lexer
+from .writers import SafeString
@@ -10,7 +10,7 @@ Some shortcuts
 """
 
 import hashlib
-import html
+import re
 
 
 hashlib_sha1 = lambda s: hashlib.sha1(bytes(s, "utf8"))
@@ -40,7 +40,31 @@ def to_str(obj):
     return obj
 
 
+_re_non_ascii = re.compile(r"[^\x00-\x7f]")
+
+
+def _charref(match):
+    return "&#%d;" % ord(match.group())
+
+
+def escape_text(value):
+    #: one `str.replace` pass per special character, each returning the same string when nothing matches
+    return (
+        value.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&#x27;")
+    )
+
+
+def escape_ascii(value):
+    if value.isascii():
+        return value
+    return _re_non_ascii.sub(_charref, value)
+
+
 def htmlescape(obj):
     if hasattr(obj, "__html__"):
         return obj.__html__()
-    return html.escape(to_str(obj), True).replace("'", "&#39;")
+    return escape_text(to_str(obj))
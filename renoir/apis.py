@@ -9,24 +9,46 @@ Provides the main apis for the templating system.
 :license: BSD-3-Clause
 """
 
+import builtins
+import gc
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
 from functools import reduce
-from typing import Any, Dict, List, Optional, Tuple, Type
+from inspect import CO_ASYNC_GENERATOR, CO_COROUTINE, CO_GENERATOR
+from types import FunctionType
+from typing import IO, Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Type
 
-from .cache import TemplaterCache
-from .constants import ESCAPES, MODES, NOFILEPATH
+from .cache import TemplaterCache, dump_bundle, load_bundle
+from .compiler import compile_template, is_function_code
+from .constants import DEFAULT_CHUNK_SIZE, ESCAPES, MODES, NOFILEPATH, OUTPUTS, PHASES, RELOADERS, TARGETS
 from .debug import make_traceback
-from .errors import TemplateError, TemplateMissingError, TemplateSyntaxError
+from .errors import TemplateBundleError, TemplateError, TemplateMissingError, TemplateSyntaxError
 from .extensions import Extension
-from .helpers import ParserCtx, TemplateReference, adict
+from .helpers import LineTable, ParserCtx, PrecompileReport, RenderEvent, TemplateReference, adict
 from .parsing import HTMLIndentTemplateParser, HTMLTemplateParser, IndentTemplateParser, Lexer, TemplateParser
-from .typing import ContextType, LoaderType, RenderType
-from .writers import EscapeAllWriter, Writer
+from .typing import ContextType, HookType, LoaderType, OutputType, RenderType
+from .watchers import make_watcher
+from .writers import (
+    BytesStreamBuffer,
+    BytesWriter,
+    EscapeAllBytesWriter,
+    EscapeAllWriter,
+    StreamBuffer,
+    Writer,
+    WriterPool,
+)
+
+
+_sync_targets = {TARGETS.render, TARGETS.stream}
+_async_targets = {TARGETS.render_async, TARGETS.stream_async}
 
 
 class Renoir:
     _writers = {ESCAPES.common: Writer, ESCAPES.all: EscapeAllWriter}
+    _bytes_writers = {ESCAPES.common: BytesWriter, ESCAPES.all: EscapeAllBytesWriter}
 
     def __init__(
         self,
@@ -41,30 +63,73 @@ class Renoir:
         escape: str = ESCAPES.common,
         adjust_indent: bool = False,
         reload: bool = False,
+        reload_backend: str = RELOADERS.stat,
+        reload_interval: float = 0.5,
         debug: bool = False,
+        cache_path: Optional[str] = None,
+        writer: Optional[Type[Writer]] = None,
+        output: str = OUTPUTS.str,
+        cache_max_entries: Optional[int] = None,
+        cache_max_bytes: Optional[int] = None,
+        hooks: Optional[List[HookType]] = None,
     ):
         self.path = path or os.getcwd()
         self.loaders = loaders or {}
         self.renderers = renderers or []
         self.contexts = contexts or []
+        self.hooks = hooks or []
         self.lexers = lexers or {}
         self.delimiters = delimiters
         self.encoding = encoding
         self.mode = mode
         self.escape = escape
         self.indent = adjust_indent
-        self.cache = TemplaterCache(self, reload=reload or debug)
+        self.output = output
+        self._writer_cls = writer
+        reload = reload or debug
+        self.cache = TemplaterCache(
+            self,
+            reload=reload,
+            path=cache_path,
+            max_entries=cache_max_entries,
+            max_bytes=cache_max_bytes,
+            watcher=make_watcher(reload_interval) if reload and reload_backend == RELOADERS.watch else None,
+        )
         self._extensions = []
         self._extensions_env = {}
+        self._static_context = {}
         self._configure()
 
     def _configure(self):
-        self.writer_cls = self._writers.get(self.escape, self._writers[ESCAPES.common])
+        writers = self._bytes_writers if self.output == OUTPUTS.bytes else self._writers
+        self.writer_cls = self._writer_cls or writers.get(self.escape, writers[ESCAPES.common])
+        self.buffer_cls = BytesStreamBuffer if self.output == OUTPUTS.bytes else StreamBuffer
+        self.writers = WriterPool(self.writer_cls)
         if not self.indent:
             self.parser_cls = HTMLTemplateParser if self.mode == MODES.html else TemplateParser
         else:
             self.parser_cls = HTMLIndentTemplateParser if self.mode == MODES.html else IndentTemplateParser
-        self.preload = self._preload if self.loaders else self._no_preload
+        self._preloader = self._preload if self.loaders else self._no_preload
+        #: base namespace of every render, copied and never mutated
+        self._namespace = {"__builtins__": builtins.__dict__, **self._static_context}
+
+    def add_hook(self, hook: HookType):
+        self.hooks.append(hook)
+
+    def _emit(self, phase, name, elapsed, cached=None):
+        event = RenderEvent(phase, name, elapsed, cached)
+        for hook in self.hooks:
+            hook(event)
+
+    def preload(self, file_name, path=None):
+        #: phases are measured only when hooks are registered
+        traced = bool(self.hooks)
+        if traced:
+            start = time.perf_counter()
+        rv = self._preloader(file_name, path)
+        if traced:
+            self._emit(PHASES.preload, file_name, time.perf_counter() - start)
+        return rv
 
     def __init_extension(self, ext_cls):
         namespace = ext_cls.namespace or ext_cls.__name__
@@ -88,6 +153,8 @@ class Renoir:
             self.lexers[name] = lexer(ext=ext)
         self._extensions.append(ext)
         ext.on_load()
+        if ext._ext_static_context_:
+            self._static_context.update(ext.static_context())
         self._configure()
         return ext
 
@@ -106,67 +173,388 @@ class Renoir:
             source = file_obj.read()
         return source
 
+    def _load_entry(self, file_path):
+        start = time.perf_counter()
+        try:
+            rv = self._load(file_path)
+        except Exception:
+            raise TemplateMissingError(file_path)
+        self.cache.load.set(file_path, rv)
+        self.cache.load.add_compile_time(time.perf_counter() - start)
+        return rv
+
     def load(self, file_path):
+        traced = bool(self.hooks)
+        if traced:
+            start = time.perf_counter()
         rv = self.cache.load.get(file_path)
-        if not rv:
-            try:
-                rv = self._load(file_path)
-            except Exception:
-                raise TemplateMissingError(file_path)
-            self.cache.load.set(file_path, rv)
+        cached = bool(rv)
+        if not cached:
+            rv = self.cache.load.flight(file_path, None, self._load_entry, file_path)
+        if traced:
+            self._emit(PHASES.load, file_path, time.perf_counter() - start, cached)
         return rv
 
     def _prerender(self, source, name):
         return reduce(lambda source, renderer: renderer(source, name), self.renderers, source)
 
+    def _prerender_entry(self, source, name):
+        start = time.perf_counter()
+        rv = self._prerender(source, name)
+        self.cache.prerender.set(name, source, rv)
+        self.cache.prerender.add_compile_time(time.perf_counter() - start)
+        return rv
+
     def prerender(self, source, name):
+        traced = bool(self.hooks)
+        if traced:
+            start = time.perf_counter()
         rv = self.cache.prerender.get(name, source)
-        if not rv:
-            rv = self._prerender(source, name)
-            self.cache.prerender.set(name, source)
+        cached = bool(rv)
+        if not cached:
+            rv = self.cache.prerender.flight(name, source, self._prerender_entry, source, name)
+        if traced:
+            self._emit(PHASES.prerender, name, time.perf_counter() - start, cached)
         return rv
 
-    def parse(self, file_path, source, context):
-        code, content = self.cache.parse.get(file_path, source)
+    def _build_parser(self, file_path, source, context):
+        return self.parser_cls(
+            self, source, name=file_path, scope=context, lexers=self.lexers, delimiters=self.delimiters
+        )
+
+    def _compile(self, file_path, text, content, target):
+        try:
+            return compile_template(text, os.path.split(file_path)[-1], target)
+        except SyntaxError:
+            parser_ctx = ParserCtx(file_path, content)
+            raise TemplateSyntaxError(parser_ctx, *sys.exc_info())
+
+    def _parse(self, file_path, source, context, target=TARGETS.render):
+        parser = self._build_parser(file_path, source, context)
+        code = self._compile(file_path, parser.render(), parser.content, target)
+        return code, parser.content, parser.dependencies
+
+    def _cached_parse(self, file_path, source, target):
+        bundled = self.cache.bundle.get(file_path)
+        if bundled:
+            codes, content = bundled
+            if target in codes:
+                return codes[target], content
+        return self.cache.targets[target].get(file_path, source)
+
+    def _parse_entry(self, file_path, source, context, target):
+        cache = self.cache.targets[target]
+        start = time.perf_counter()
+        code, content, dependencies = self.cache.bytecode.get(file_path, source, target)
         if not code:
-            parser = self.parser_cls(
-                self, source, name=file_path, scope=context, lexers=self.lexers, delimiters=self.delimiters
+            code, content, dependencies = self._parse(file_path, source, context, target)
+            #: only the lines references are needed after compilation, the parsed tree can be freed
+            content = LineTable(content.reference())
+            self.cache.bytecode.set(file_path, source, target, code, content, dependencies)
+        cache.set(file_path, source, code, content, dependencies)
+        cache.add_compile_time(time.perf_counter() - start)
+        return code, content
+
+    def parse(self, file_path, source, context, target=TARGETS.render):
+        traced = bool(self.hooks)
+        if traced:
+            start = time.perf_counter()
+        code, content = self._cached_parse(file_path, source, target)
+        cached = bool(code)
+        if not cached:
+            code, content = self.cache.targets[target].flight(
+                file_path, source, self._parse_entry, file_path, source, context, target
             )
-            try:
-                code = compile(parser.render(), os.path.split(file_path)[-1], "exec")
-            except SyntaxError:
-                parser_ctx = ParserCtx(file_path, parser.content)
-                raise TemplateSyntaxError(parser_ctx, *sys.exc_info())
-            content = parser.content
-            self.cache.parse.set(file_path, source, code, content, parser.dependencies)
+        if traced:
+            self._emit(PHASES.parse, file_path, time.perf_counter() - start, cached)
         return code, content
 
     def inject(self, context):
         for injector in self.contexts:
             injector(context)
 
-    def _render(self, source="", file_path=NOFILEPATH, context=None):
-        context = context or {}
-        context["__writer__"] = self.writer_cls()
+    def _build_context(self, context, writer):
+        rv = self._namespace.copy()
+        if context:
+            rv.update(context)
+        rv["__writer__"] = writer
+        return rv
+
+    def _prepare(self, source, file_path, context, writer, target=TARGETS.render):
+        context = self._build_context(context, writer)
         try:
-            code, content = self.parse(file_path, source, context)
+            code, content = self.parse(file_path, source, context, target)
         except (TemplateError, TemplateSyntaxError):
             make_traceback(sys.exc_info())
+        traced = bool(self.hooks)
+        if traced:
+            start = time.perf_counter()
         self.inject(context)
+        if traced:
+            self._emit(PHASES.inject, file_path, time.perf_counter() - start)
+        return code, content, context
+
+    def _raise_exception(self, file_path, content, context):
+        exc_info = sys.exc_info()
+        try:
+            parser_ctx = ParserCtx(file_path, content)
+            template_ref = TemplateReference(parser_ctx, *exc_info)
+        except Exception:
+            template_ref = None
+        context["__renoir_template__"] = template_ref
+        make_traceback(exc_info)
+
+    @staticmethod
+    def _build_function(code, context):
+        return FunctionType(code, context)
+
+    def _execute(self, code, content, file_path, context):
+        traced = bool(self.hooks)
+        if traced:
+            start = time.perf_counter()
         try:
-            exec(code, context)
+            if is_function_code(code):
+                self._build_function(code, context)(context["__writer__"], context)
+            else:
+                exec(code, context)
         except Exception:
-            exc_info = sys.exc_info()
+            self._raise_exception(file_path, content, context)
+        finally:
+            if traced:
+                self._emit(PHASES.execute, file_path, time.perf_counter() - start)
+
+    def _write(self, writer, source="", file_path=NOFILEPATH, context=None):
+        code, content, context = self._prepare(source, file_path, context, writer)
+        self._execute(code, content, file_path, context)
+
+    def _render(self, source="", file_path=NOFILEPATH, context=None):
+        writer = self.writers.acquire()
+        try:
+            self._write(writer, source, file_path, context)
+            return writer.getvalue()
+        finally:
+            self.writers.release(writer)
+
+    def _stream(self, source="", file_path=NOFILEPATH, context=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        buffer = self.buffer_cls()
+        code, content, context = self._prepare(source, file_path, context, self.writer_cls(buffer), TARGETS.stream)
+        if not code.co_flags & CO_GENERATOR:
+            #: the template can't be suspended, render it all and split the result
+            self._execute(code, content, file_path, context)
+            body = buffer.flush()
+            for idx in range(0, len(body), chunk_size):
+                yield body[idx : idx + chunk_size]
+            return
+        steps = self._build_function(code, context)(context["__writer__"], context)
+        traced, elapsed = bool(self.hooks), 0.0
+        while True:
+            if traced:
+                start = time.perf_counter()
+            try:
+                next(steps)
+            except StopIteration:
+                break
+            except Exception:
+                self._raise_exception(file_path, content, context)
+            finally:
+                if traced:
+                    elapsed += time.perf_counter() - start
+            if buffer.size >= chunk_size:
+                yield buffer.flush()
+        if traced:
+            self._emit(PHASES.execute, file_path, elapsed)
+        body = buffer.flush()
+        if body:
+            yield body
+
+    async def _execute_async(self, code, content, file_path, context):
+        traced = bool(self.hooks)
+        if traced:
+            start = time.perf_counter()
+        try:
+            if is_function_code(code):
+                await self._build_function(code, context)(context["__writer__"], context)
+            elif code.co_flags & CO_COROUTINE:
+                await eval(code, context)
+            else:
+                exec(code, context)
+        except Exception:
+            self._raise_exception(file_path, content, context)
+        finally:
+            if traced:
+                self._emit(PHASES.execute, file_path, time.perf_counter() - start)
+
+    async def _render_async(self, source="", file_path=NOFILEPATH, context=None):
+        writer = self.writers.acquire()
+        try:
+            code, content, context = self._prepare(source, file_path, context, writer, TARGETS.render_async)
+            await self._execute_async(code, content, file_path, context)
+            return writer.getvalue()
+        finally:
+            self.writers.release(writer)
+
+    async def _stream_async(self, source="", file_path=NOFILEPATH, context=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        buffer = self.buffer_cls()
+        code, content, context = self._prepare(
+            source, file_path, context, self.writer_cls(buffer), TARGETS.stream_async
+        )
+        if not code.co_flags & CO_ASYNC_GENERATOR:
+            #: the template can't be suspended, render it all and split the result
+            await self._execute_async(code, content, file_path, context)
+            body = buffer.flush()
+            for idx in range(0, len(body), chunk_size):
+                yield body[idx : idx + chunk_size]
+            return
+        steps = self._build_function(code, context)(context["__writer__"], context)
+        traced, elapsed = bool(self.hooks), 0.0
+        while True:
+            if traced:
+                start = time.perf_counter()
             try:
-                parser_ctx = ParserCtx(file_path, content)
-                template_ref = TemplateReference(parser_ctx, *exc_info)
+                await steps.__anext__()
+            except StopAsyncIteration:
+                break
             except Exception:
-                template_ref = None
-            context["__renoir_template__"] = template_ref
-            make_traceback(exc_info)
-        return context["__writer__"].body.getvalue()
+                self._raise_exception(file_path, content, context)
+            finally:
+                if traced:
+                    elapsed += time.perf_counter() - start
+            if buffer.size >= chunk_size:
+                yield buffer.flush()
+        if traced:
+            self._emit(PHASES.execute, file_path, elapsed)
+        body = buffer.flush()
+        if body:
+            yield body
+
+    def _load_source(self, file_path, target=TARGETS.render):
+        #: bundled templates might miss the code for sync targets
+        if target in self.cache.bundle.get(file_path, ({},))[0]:
+            return ""
+        return self.prerender(self.load(file_path), file_path)
+
+    def render(self, template_file_name: str, context: Optional[Dict[str, Any]] = None) -> OutputType:
+        file_path = os.path.join(*self.preload(template_file_name))
+        return self._render(self._load_source(file_path), file_path, context)
+
+    def render_into(self, template_file_name: str, fp: IO, context: Optional[Dict[str, Any]] = None):
+        file_path = os.path.join(*self.preload(template_file_name))
+        self._write(self.writer_cls(fp), self._load_source(file_path), file_path, context)
+
+    def stream(
+        self,
+        template_file_name: str,
+        context: Optional[Dict[str, Any]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> Iterator[OutputType]:
+        file_path = os.path.join(*self.preload(template_file_name))
+        return self._stream(self._load_source(file_path, TARGETS.stream), file_path, context, chunk_size)
+
+    async def render_async(self, template_file_name: str, context: Optional[Dict[str, Any]] = None) -> OutputType:
+        file_path = os.path.join(*self.preload(template_file_name))
+        return await self._render_async(self._load_source(file_path, TARGETS.render_async), file_path, context)
 
-    def render(self, template_file_name: str, context: Optional[Dict[str, Any]] = None) -> str:
+    def stream_async(
+        self,
+        template_file_name: str,
+        context: Optional[Dict[str, Any]] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> AsyncIterator[OutputType]:
         file_path = os.path.join(*self.preload(template_file_name))
-        source = self.prerender(self.load(file_path), file_path)
-        return self._render(source, file_path, context)
+        return self._stream_async(self._load_source(file_path, TARGETS.stream_async), file_path, context, chunk_size)
+
+    def _iter_templates(self, pattern=None):
+        for path, dirs, files in os.walk(self.path):
+            dirs[:] = sorted(dir_name for dir_name in dirs if not dir_name.startswith("."))
+            for file_name in sorted(files):
+                if file_name.startswith("."):
+                    continue
+                name = os.path.relpath(os.path.join(path, file_name), self.path).replace(os.sep, "/")
+                if pattern and not fnmatch(name, pattern):
+                    continue
+                yield name
+
+    def compile_bundle(
+        self, file_path: str, pattern: Optional[str] = None, strict: bool = False
+    ) -> Dict[str, Exception]:
+        templates, errors, skipped = {}, {}, {}
+        for name in self._iter_templates(pattern):
+            template_path = os.path.join(*self.preload(name))
+            bundle_name = os.path.relpath(template_path, self.path).replace(os.sep, "/")
+            if bundle_name in templates:
+                continue
+            try:
+                source = self.prerender(self.load(template_path), template_path)
+                parser = self._build_parser(template_path, source, {})
+                text = parser.render()
+            except Exception as exc:
+                #: templates depending on the render context can't be compiled ahead of time
+                skipped[name] = exc
+                continue
+            codes, failures = {}, {}
+            for target in TARGETS:
+                try:
+                    codes[target] = self._compile(template_path, text, parser.content, target)
+                except (TemplateError, TemplateSyntaxError) as exc:
+                    failures[target] = exc
+            #: templates using `await` can't be compiled for the sync targets, which are left out
+            if failures and not (_async_targets <= codes.keys() and failures.keys() <= _sync_targets):
+                errors[name] = next(iter(failures.values()))
+            else:
+                templates[bundle_name] = (codes, LineTable(parser.content.reference()))
+        if strict:
+            errors.update(skipped)
+        if errors:
+            raise TemplateBundleError(errors)
+        dump_bundle(self, templates, file_path)
+        return skipped
+
+    def _precompile(self, name, targets=(TARGETS.render,)):
+        start = time.perf_counter()
+        failures = {}
+        file_path = os.path.join(*self.preload(name))
+        bundled = self.cache.bundle.get(file_path, ({},))[0]
+        targets = [target for target in targets if target not in bundled]
+        if targets:
+            source = self.prerender(self.load(file_path), file_path)
+            #: templates using `await` can still be compiled for the async targets
+            for target in targets:
+                try:
+                    self.parse(file_path, source, {}, target)
+                except Exception as exc:
+                    failures[target] = exc
+        return time.perf_counter() - start, failures
+
+    def precompile(
+        self, pattern: Optional[str] = None, workers: int = 1, targets: Optional[List[str]] = None
+    ) -> PrecompileReport:
+        targets = [TARGETS(target) for target in targets] if targets else [TARGETS.render]
+        report = PrecompileReport()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {name: executor.submit(self._precompile, name, targets) for name in self._iter_templates(pattern)}
+            for name, future in futures.items():
+                try:
+                    elapsed, failures = future.result()
+                except Exception as exc:
+                    elapsed, failures = None, {target: exc for target in targets}
+                if len(failures) < len(targets):
+                    report.timings[name] = elapsed
+                if failures:
+                    report.failures[name] = failures
+        report.elapsed = time.perf_counter() - start
+        return report
+
+    def freeze(self, pattern: Optional[str] = None, workers: int = 1) -> PrecompileReport:
+        #: every template needs to stay in memory, regardless of the cache limits
+        self.cache.unbound()
+        report = self.precompile(pattern, workers, targets=list(TARGETS))
+        self.cache.freeze()
+        #: move everything allocated so far out of the collector, so forked processes keep sharing it
+        gc.collect()
+        gc.freeze()
+        return report
+
+    def load_bundle(self, file_path: str):
+        for name, compiled in load_bundle(self, file_path).items():
+            self.cache.bundle[os.path.join(self.path, name)] = compiled
@@ -9,32 +9,268 @@ Provides caching utils.
 :license: BSD-3-Clause
 """
 
+import marshal
 import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
 
+from .__version__ import __version__
 from ._shortcuts import hashlib_sha1
+from .constants import TARGETS
+from .helpers import LineTable
 
 
 def make_hash(value):
     return hashlib_sha1(value).hexdigest()[:10]
 
 
+def make_signature(templater):
+    return "|".join(
+        [
+            __version__,
+            sys.implementation.cache_tag or sys.version,
+            templater.mode,
+            templater.escape,
+            templater.output,
+            f"{templater.writer_cls.__module__}.{templater.writer_cls.__qualname__}",
+            str(templater.indent),
+            "%s%s" % templater.delimiters,
+            ",".join(sorted(templater.lexers.keys())),
+            ",".join(ext.__class__.__qualname__ for ext in templater._extensions),
+        ]
+    )
+
+
+def estimate_size(value):
+    try:
+        return len(marshal.dumps(value))
+    except ValueError:
+        return sys.getsizeof(value)
+
+
+def make_lines(content):
+    return [(src, tuple(src_lines)) for src, src_lines in content.reference()]
+
+
+def dump_bundle(templater, templates, file_path):
+    data = {}
+    for name, (codes, content) in templates.items():
+        data[name] = ({target.value: code for target, code in codes.items()}, make_lines(content))
+    with open(file_path, "wb") as file_obj:
+        marshal.dump((make_signature(templater), data), file_obj)
+
+
+def load_bundle(templater, file_path):
+    with open(file_path, "rb") as file_obj:
+        #: bundles are built by the application itself, see the caching docs
+        signature, data = marshal.load(file_obj)  # noqa: S302
+    if signature != make_signature(templater):
+        raise RuntimeError(f"Bundle {file_path} was built for a different Renoir configuration")
+    return {name: (codes, LineTable(lines)) for name, (codes, lines) in data.items()}
+
+
 class TemplaterCache:
-    def __init__(self, templater, reload=False):
+    def __init__(self, templater, reload=False, path=None, max_entries=None, max_bytes=None, watcher=None):
         self.templater = templater
         self.changes = reload
+        self.watcher = watcher if reload else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bounded = bool(max_entries or max_bytes)
         self.load = LoaderCache(self)
         self.prerender = PrerenderCache(self)
-        self.parse = ParserCache(self)
+        self.targets = {target: ParserCache(self) for target in TARGETS}
+        self.parse = self.targets[TARGETS.render]
+        self.bytecode = BytecodeCache(self, path)
+        self.bundle = {}
+
+    def stats(self):
+        rv = {"load": self.load.stats(), "prerender": self.prerender.stats(), "parse": {}}
+        #: parser caches of all the targets are reported together
+        for cache in self.targets.values():
+            for key, value in cache.stats().items():
+                rv["parse"][key] = rv["parse"].get(key, 0) + value
+        return rv
+
+    def reset_stats(self):
+        for cache in [self.load, self.prerender, *self.targets.values()]:
+            cache.reset_stats()
+
+    def _reconfigure(self):
+        for cache in [self.load, self.prerender, *self.targets.values()]:
+            cache._configure()
+
+    def unbound(self):
+        self.bounded = False
+        self._reconfigure()
+
+    def freeze(self):
+        #: frozen entries are never checked for changes nor evicted
+        self.changes = False
+        self.bounded = False
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
+        for cache in [self.load, self.prerender, *self.targets.values()]:
+            cache.untrack()
+        self._reconfigure()
+
+    def sync(self):
+        for file_path in self.watcher.changes():
+            self.invalidate(file_path)
+
+    def invalidate(self, file_path):
+        self.load.invalidate(file_path)
+        self.prerender.invalidate(file_path)
+        for cache in self.targets.values():
+            for name in cache.dependents(file_path):
+                cache.invalidate(name)
+
+    def dependents(self, file_path):
+        rv = set()
+        for cache in self.targets.values():
+            rv.update(cache.dependents(file_path))
+        return rv
+
+
+class Flight:
+    """A pending computation of a cache entry, shared by concurrent callers."""
+
+    __slots__ = ["token", "event", "result", "failed"]
+
+    def __init__(self, token):
+        self.token = token
+        self.event = threading.Event()
+        self.result = None
+        self.failed = False
 
 
 class InnerCache:
     def __init__(self, cache_interface):
         self.cache = cache_interface
-        self.data = {}
+        self.data = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+        #: guards the updates of every entry, so they are published atomically
+        self.lock = threading.RLock()
+        self.flights = {}
+        self.reset_stats()
         self._configure()
 
     def _configure(self):
-        self.get = self.reloader_get if self.cache.changes else self.cached_get
+        if not self.cache.changes:
+            self._get = self.cached_get
+        elif self.cache.watcher:
+            self._get = self.watched_get
+        else:
+            self._get = self.reloader_get
+        self.get = self.lru_get if self.cache.bounded else self._get
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.compile_time = 0.0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "compile_time": self.compile_time,
+                "retained_bytes": self.size,
+            }
+
+    def _invalidated(self, key):
+        if key in self.data:
+            self.invalidations += 1
+        self.misses += 1
+
+    def lru_get(self, key, *args):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+        return self._get(key, *args)
+
+    def _published(self, key, token):
+        return self.data.get(key)
+
+    def untrack(self):
+        #: drops the data needed to detect changes, which is never checked again
+        pass
+
+    def add_compile_time(self, elapsed):
+        with self.lock:
+            self.compile_time += elapsed
+
+    def flight(self, key, token, builder, *args):
+        #: concurrent misses on the same key wait for a single computation
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                #: a previous flight might have published the entry after the caller lookup
+                rv = self._published(key, token)
+                if rv is not None:
+                    return rv
+                self.flights[key] = flight = Flight(token)
+        if not leader:
+            flight.event.wait()
+            if not flight.failed and (flight.token is token or flight.token == token):
+                return flight.result
+            return builder(*args)
+        try:
+            flight.result = builder(*args)
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            flight.event.set()
+        return flight.result
+
+    def _estimate_size(self, key, value):
+        return estimate_size(value)
+
+    def _store(self, key, value):
+        if key in self.data:
+            self.size -= self.sizes.pop(key, 0)
+            self.data.move_to_end(key)
+        self.data[key] = value
+        #: sizes are tracked in every mode, so stats don't need to measure entries
+        self.sizes[key] = size = self._estimate_size(key, value)
+        self.size += size
+        if self.cache.bounded:
+            self._evict()
+
+    def _over_limits(self):
+        if self.cache.max_entries and len(self.data) > self.cache.max_entries:
+            return True
+        return bool(self.cache.max_bytes and self.size > self.cache.max_bytes)
+
+    def _evict(self):
+        #: the most recent entry is always kept, even if it exceeds the limits
+        while len(self.data) > 1 and self._over_limits():
+            self.discard(next(iter(self.data)))
+            self.evictions += 1
+
+    def discard(self, key):
+        self.data.pop(key, None)
+        self.size -= self.sizes.pop(key, 0)
+
+    def invalidate(self, key):
+        with self.lock:
+            if key in self.data:
+                self.invalidations += 1
+            self.discard(key)
 
 
 class LoaderCache(InnerCache):
@@ -46,72 +282,288 @@ class LoaderCache(InnerCache):
         try:
             mtime = os.stat(file_path).st_mtime
         except Exception:
+            self.misses += 1
             return None
-        old_time = self.mtimes.get(file_path, 0)
-        if mtime > old_time:
-            return None
+        with self.lock:
+            old_time = self.mtimes.get(file_path, 0)
+            if mtime > old_time:
+                self.misses += 1
+                if file_path in self.data:
+                    self.cache.invalidate(file_path)
+                return None
+            return self.cached_get(file_path)
+
+    def watched_get(self, file_path):
+        self.cache.sync()
         return self.cached_get(file_path)
 
     def cached_get(self, file_path):
-        return self.data.get(file_path)
+        rv = self.data.get(file_path)
+        if rv is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return rv
 
     def set(self, file_path, source):
-        self.data[file_path] = source
-        self.mtimes[file_path] = os.stat(file_path).st_mtime
+        mtime = os.stat(file_path).st_mtime if self.cache.changes else None
+        if self.cache.watcher:
+            self.cache.watcher.watch(file_path)
+        with self.lock:
+            if mtime is not None:
+                self.mtimes[file_path] = mtime
+            self._store(file_path, source)
+
+    def discard(self, file_path):
+        super().discard(file_path)
+        self.mtimes.pop(file_path, None)
+
+    def untrack(self):
+        with self.lock:
+            self.mtimes = {}
 
 
 class HashableCache(InnerCache):
     def __init__(self, cache_interface):
         super().__init__(cache_interface)
         self.hashes = {}
+        self.sources = {}
+
+    def _changed(self, name, source):
+        #: sources coming from the upper cache layers are the very same objects
+        if self.sources.get(name) is source:
+            return False
+        #: fallback for other sources, like the ones given to `Renoir._render`
+        if self.hashes.get(name) != make_hash(source):
+            return True
+        self.sources[name] = source
+        return False
 
     def reloader_get(self, name, source):
-        hashed = make_hash(source)
-        if self.hashes.get(name) != hashed:
+        with self.lock:
+            if self._changed(name, source):
+                self._invalidated(name)
+                return None
+            return self.cached_get(name, source)
+
+    def _published(self, name, source):
+        rv = self.data.get(name)
+        if rv is not None and self.cache.changes and self._changed(name, source):
             return None
-        return self.cached_get(name, source)
+        return rv
+
+    def watched_get(self, name, source):
+        return self.reloader_get(name, source)
 
     def cached_get(self, name, source):
-        return self.data.get(name)
+        rv = self.data.get(name)
+        if rv is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return rv
 
-    def set(self, name, source):
-        self.data[name] = source
+    def _track(self, name, source):
         if self.cache.changes:
             self.hashes[name] = make_hash(source)
+            self.sources[name] = source
+
+    def set(self, name, source):
+        with self.lock:
+            self._track(name, source)
+            self._store(name, source)
+
+    def discard(self, name):
+        super().discard(name)
+        self.hashes.pop(name, None)
+        self.sources.pop(name, None)
+
+    def untrack(self):
+        with self.lock:
+            self.hashes = {}
+            self.sources = {}
 
 
 class PrerenderCache(HashableCache):
-    pass
+    def set(self, name, source, rendered):
+        with self.lock:
+            self._track(name, source)
+            self._store(name, rendered)
 
 
 class ParserCache(HashableCache):
     def __init__(self, cache_interface):
         super().__init__(cache_interface)
-        self.cdata = {}
         self.dependencies = {}
+        self.files = {}
+        self.reverse_dependencies = {}
 
-    def _expired_dependency(self, name, preload_params):
-        path, file_name = self.cache.templater.preload(name, **preload_params)
-        file_path = os.path.join(path, file_name)
-        if os.stat(file_path).st_mtime != self.cache.load.mtimes[file_path]:
+    def _expired_dependency(self, file_path):
+        try:
+            mtime = os.stat(file_path).st_mtime
+        except OSError:
             return True
-        return False
+        #: dependencies evicted from the loader cache need to be loaded again
+        return mtime != self.cache.load.mtimes.get(file_path)
 
     def reloader_get(self, name, source):
-        hashed = make_hash(source)
-        if self.hashes.get(name) != hashed:
-            return None, None
-        for dep_name, dep_preload_params in self.dependencies[name].values():
-            if self._expired_dependency(dep_name, dep_preload_params):
+        with self.lock:
+            if self._changed(name, source):
+                self._invalidated(name)
+                return None, None
+            for file_path in self.files.get(name, ()):
+                if self._expired_dependency(file_path):
+                    self._invalidated(name)
+                    return None, None
+            return self.cached_get(name, source)
+
+    def _published(self, name, source):
+        rv = super()._published(name, source)
+        if rv is not None and self.cache.changes and not self.cache.watcher:
+            if any(self._expired_dependency(file_path) for file_path in self.files.get(name, ())):
+                return None
+        return rv
+
+    def watched_get(self, name, source):
+        #: changed dependencies get invalidated by the watcher
+        with self.lock:
+            if self._changed(name, source):
+                self._invalidated(name)
                 return None, None
-        return self.cached_get(name, source)
+            return self.cached_get(name, source)
 
     def cached_get(self, name, source):
-        return self.data.get(name), self.cdata.get(name)
+        #: code and content are stored together, so readers never see them out of step
+        rv = self.data.get(name)
+        if rv is None:
+            self.misses += 1
+            return None, None
+        self.hits += 1
+        return rv
+
+    def dependents(self, file_path):
+        with self.lock:
+            rv = set(self.reverse_dependencies.get(file_path, ()))
+            if file_path in self.data:
+                rv.add(file_path)
+        return rv
+
+    def _index(self, name, files):
+        self._unindex(name)
+        self.files[name] = files
+        for file_path in files:
+            self.reverse_dependencies.setdefault(file_path, set()).add(name)
+
+    def _unindex(self, name):
+        for file_path in self.files.pop(name, ()):
+            names = self.reverse_dependencies.get(file_path)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.reverse_dependencies[file_path]
+
+    def _estimate_size(self, name, entry):
+        compiled, lines = entry
+        return estimate_size(compiled) + sys.getsizeof(lines.lines)
 
     def set(self, name, source, compiled, content, dependencies):
-        self.data[name] = compiled
-        self.cdata[name] = content
+        files = None
         if self.cache.changes:
-            self.hashes[name] = make_hash(source)
-            self.dependencies[name] = dependencies
+            files = {
+                os.path.join(*self.cache.templater.preload(dep_name, **dep_preload_params))
+                for dep_name, dep_preload_params in dependencies.values()
+            }
+        with self.lock:
+            self._track(name, source)
+            if files is not None:
+                self.dependencies[name] = dependencies
+                self._index(name, files)
+            self._store(name, (compiled, content))
+
+    def discard(self, name):
+        super().discard(name)
+        self.dependencies.pop(name, None)
+        self._unindex(name)
+
+    def untrack(self):
+        with self.lock:
+            super().untrack()
+            self.dependencies = {}
+            self.files = {}
+            self.reverse_dependencies = {}
+
+
+class BytecodeCache:
+    def __init__(self, cache_interface, path=None):
+        self.cache = cache_interface
+        self.path = path
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+        self._configure()
+
+    def _configure(self):
+        self.get = self.disk_get if self.path else self.null_get
+        self.set = self.disk_set if self.path else self.null_set
+
+    def _key(self, name, target):
+        return "|".join([make_signature(self.cache.templater), target.value, name])
+
+    def _file_path(self, key):
+        return os.path.join(self.path, hashlib_sha1(key).hexdigest() + ".rbc")
+
+    def _dependency_hash(self, preload_name, preload_path):
+        params = {"path": preload_path} if preload_path is not None else {}
+        path, file_name = self.cache.templater.preload(preload_name, **params)
+        return make_hash(self.cache.templater.load(os.path.join(path, file_name)))
+
+    def null_get(self, name, source, target):
+        return None, None, None
+
+    def null_set(self, name, source, target, compiled, content, dependencies):
+        pass
+
+    def disk_get(self, name, source, target):
+        key = self._key(name, target)
+        try:
+            with open(self._file_path(key), "rb") as file_obj:
+                #: the cache directory is owned by the application, see the caching docs
+                stored_key, source_hash, deps, lines, compiled = marshal.load(file_obj)  # noqa: S302
+        except Exception:
+            return None, None, None
+        if stored_key != key or source_hash != make_hash(source):
+            return None, None, None
+        dependencies = {}
+        for dep_key, preload_name, preload_path, dep_hash in deps:
+            try:
+                if self._dependency_hash(preload_name, preload_path) != dep_hash:
+                    return None, None, None
+            except Exception:
+                return None, None, None
+            params = {"path": Path(preload_path)} if preload_path is not None else {}
+            dependencies[dep_key] = (preload_name, params)
+        return compiled, LineTable(lines), dependencies
+
+    def disk_set(self, name, source, target, compiled, content, dependencies):
+        key = self._key(name, target)
+        try:
+            deps = []
+            for dep_key, (preload_name, params) in dependencies.items():
+                preload_path = str(params["path"]) if "path" in params else None
+                deps.append((dep_key, preload_name, preload_path, self._dependency_hash(preload_name, preload_path)))
+            data = marshal.dumps((key, make_hash(source), deps, make_lines(content), compiled))
+        except Exception:
+            return
+        #: write on a temporary file and move it, so readers never see partial data
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as file_obj:
+                file_obj.write(data)
+            os.replace(tmp_path, self._file_path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
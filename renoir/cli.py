@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+renoir.cli
+----------
+
+Provides the command line interface.
+
+:copyright: 2014 Giovanni Barillari
+:license: BSD-3-Clause
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+from .apis import Renoir
+from .constants import ESCAPES, MODES, OUTPUTS
+from .errors import TemplateBundleError
+
+
+def _import_templater(spec):
+    module_name, _, attr = spec.partition(":")
+    obj = importlib.import_module(module_name)
+    for name in (attr or "templater").split("."):
+        obj = getattr(obj, name)
+    if not isinstance(obj, Renoir):
+        raise RuntimeError(f"{spec} is not a Renoir instance")
+    return obj
+
+
+def _build_templater(args):
+    if args.templater:
+        templater = _import_templater(args.templater)
+        templater.path = os.path.abspath(args.path)
+        return templater
+    return Renoir(
+        path=os.path.abspath(args.path),
+        delimiters=tuple(args.delimiters),
+        encoding=args.encoding,
+        mode=args.mode,
+        escape=args.escape,
+        adjust_indent=args.adjust_indent,
+        output=args.output_type,
+    )
+
+
+def compile_command(args):
+    templater = _build_templater(args)
+    try:
+        skipped = templater.compile_bundle(args.output, pattern=args.pattern, strict=args.strict)
+    except TemplateBundleError as exc:
+        for name, error in exc.errors.items():
+            print(f"error: {name}: {getattr(error, 'message', error)}", file=sys.stderr)
+        print(exc.message, file=sys.stderr)
+        return 1
+    for name, error in skipped.items():
+        print(f"skipped: {name}: {getattr(error, 'message', error)}", file=sys.stderr)
+    print(f"Templates bundle written to {args.output}", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="renoir")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser("compile", help="compile templates into a bundle")
+    compile_parser.add_argument("path", help="templates root path")
+    compile_parser.add_argument("-o", "--output", default="templates.bundle", help="bundle destination file")
+    compile_parser.add_argument("--pattern", help="compile only templates matching the given glob pattern")
+    compile_parser.add_argument("--templater", help="import path of the Renoir instance to use, as 'module:attribute'")
+    compile_parser.add_argument("--mode", choices=[mode.value for mode in MODES], default=MODES.html.value)
+    compile_parser.add_argument("--escape", choices=[escape.value for escape in ESCAPES], default=ESCAPES.common.value)
+    compile_parser.add_argument("--adjust-indent", action="store_true")
+    compile_parser.add_argument(
+        "--output-type", choices=[output.value for output in OUTPUTS], default=OUTPUTS.str.value
+    )
+    compile_parser.add_argument("--delimiters", nargs=2, default=["{{", "}}"], metavar=("START", "END"))
+    compile_parser.add_argument("--encoding", default="utf8")
+    compile_parser.add_argument(
+        "--strict", action="store_true", help="fail also on templates which can't be compiled without a context"
+    )
+    compile_parser.set_defaults(func=compile_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+renoir.compiler
+---------------
+
+Provides the compilers for templates code.
+
+:copyright: 2014 Giovanni Barillari
+:license: BSD-3-Clause
+"""
+
+import ast
+import builtins
+import re
+import symtable
+from inspect import CO_ASYNC_GENERATOR, CO_GENERATOR, CO_OPTIMIZED
+from types import CodeType
+
+from .constants import CODE_HEADER_LINES, TARGETS
+
+
+#: names which rely on the module-level evaluation of templates
+_dynamic_scope_names = ("locals", "vars", "dir", "exec", "eval", "globals")
+_builtin_names = set(dir(builtins))
+_writer_methods = ("write", "escape", "text", "html")
+
+_re_definitions = re.compile(r"(?:async +)?(?:def|class)\b")
+_re_leaving = re.compile(r"(?:return|yield)\b")
+_re_leaving_lines = re.compile(r"^ *(?:return|yield)\b", re.M)
+
+
+def writer_local(writer, method):
+    #: the name the compiled templates bind the writer method to
+    return f"{writer.rstrip('_')}_{method}__"
+
+
+def _is_dunder(name):
+    return name.startswith("__") and name.endswith("__")
+
+
+class TemplateScope:
+    """Collects the names used in the template scope from the symbol table of
+    the template code, and checks whether the code can be moved inside a
+    function."""
+
+    def __init__(self, source, filename, reserved):
+        self.stored = set()
+        self.loaded = set()
+        self.globals = set()
+        self.dynamic = "import *" in source
+        table = symtable.symtable(source, filename, "exec")
+        for symbol in table.get_symbols():
+            name = symbol.get_name()
+            if name in reserved:
+                continue
+            if symbol.is_declared_global():
+                #: also reports the names declared global by nested scopes
+                self.globals.add(name)
+            if symbol.is_assigned() or symbol.is_imported():
+                self.stored.add(name)
+            if symbol.is_referenced():
+                self.loaded.add(name)
+                self.dynamic = self.dynamic or name in _dynamic_scope_names
+        tables = table.get_children()
+        while tables:
+            table = tables.pop()
+            for symbol in table.get_symbols():
+                if not symbol.is_referenced():
+                    continue
+                #: nested scopes will access template locals as closures
+                if symbol.is_global() or symbol.is_free():
+                    self.loaded.add(symbol.get_name())
+                self.dynamic = self.dynamic or symbol.get_name() in _dynamic_scope_names
+            tables.extend(table.get_children())
+
+
+def _template_lines(lines):
+    #: yields the indexes of the lines in the template scope, skipping nested definitions
+    definition = None
+    for idx, line in enumerate(lines):
+        code = line.lstrip(" ")
+        indent = len(line) - len(code)
+        if definition is not None:
+            if indent > definition:
+                continue
+            definition = None
+        if _re_definitions.match(code):
+            definition = indent
+            continue
+        yield idx
+
+
+def _leaves_template(text):
+    #: `return` and `yield` would change the template function behaviour
+    if not _re_leaving_lines.search(text):
+        return False
+    lines = text.split("\n")
+    return any(_re_leaving.match(lines[idx].lstrip(" ")) for idx in _template_lines(lines))
+
+
+def _yield_writes(text, writer):
+    #: suspends the template execution after every write in the template scope
+    locals_ = "|".join(re.escape(writer_local(writer, method)) for method in _writer_methods)
+    writes = re.compile(rf"^( *)((?:{re.escape(writer)}\.|(?:{locals_})\())", re.M)
+    if not _re_definitions.search(text):
+        return writes.sub(r"\1yield \2", text)
+    lines = text.split("\n")
+    for idx in _template_lines(lines):
+        lines[idx] = writes.sub(r"\1yield \2", lines[idx])
+    return "\n".join(lines)
+
+
+def _compile_module(source, filename, is_async=False):
+    flags = ast.PyCF_ALLOW_TOP_LEVEL_AWAIT if is_async else 0
+    return compile(source, filename, "exec", flags=flags)
+
+
+def is_function_code(code):
+    return bool(code.co_flags & CO_OPTIMIZED)
+
+
+def compile_template(text, filename, target=TARGETS.render, writer="__writer__"):
+    is_async = target in (TARGETS.render_async, TARGETS.stream_async)
+    is_generator = target in (TARGETS.stream, TARGETS.stream_async)
+    locals_ = {writer_local(writer, method): method for method in _writer_methods}
+    bindings = [f"{name} = {writer}.{method}" for name, method in locals_.items() if name in text]
+    #: both the function and the module sources put the template code after `CODE_HEADER_LINES` lines
+    source = "\n" * (CODE_HEADER_LINES - 1) + "; ".join(bindings) + "\n" + text
+    arguments = (writer, "__context__")
+    scope = TemplateScope(source, filename, set(locals_) | set(arguments))
+    if scope.dynamic or _leaves_template(text):
+        return _compile_module(source, filename, is_async)
+    #: names which should keep the module semantics
+    global_names = {name for name in scope.stored if name in _builtin_names or _is_dunder(name)} | scope.globals
+    #: only names both assigned and read by the template need to be loaded from the context,
+    #  the others are read from the function globals, which is the context itself
+    local_names = {name for name in scope.stored & scope.loaded if not _is_dunder(name)} - global_names
+    prelude = [f"global {', '.join(sorted(global_names))}"] if global_names else []
+    prelude.extend(bindings)
+    for name in sorted(local_names):
+        prelude.append(f"{name!r} in __context__ and ({name} := __context__[{name!r}])")
+    body = text
+    if is_generator:
+        #: ensure we always build a generator
+        body = _yield_writes(body, writer) + "\nyield"
+    code = compile(
+        "".join(
+            [
+                f"{'async ' if is_async else ''}def template({', '.join(arguments)}):\n ",
+                "; ".join(prelude) or "pass",
+                "\n ",
+                body.replace("\n", "\n "),
+            ]
+        ),
+        filename,
+        "exec",
+    )
+    code = next(const for const in code.co_consts if isinstance(const, CodeType))
+    if not is_generator and code.co_flags & (CO_GENERATOR | CO_ASYNC_GENERATOR):
+        #: `yield` expressions in the template scope, let the module compilation raise
+        return _compile_module(source, filename, is_async)
+    return code
@@ -13,6 +13,9 @@ from enum import Enum
 
 
 NOFILEPATH = "<string>"
+DEFAULT_CHUNK_SIZE = 8192
+#: lines preceding the template code in compiled templates
+CODE_HEADER_LINES = 2
 
 
 class MODES(str, Enum):
@@ -23,3 +26,29 @@ class MODES(str, Enum):
 class ESCAPES(str, Enum):
     all = "all"
     common = "common"
+
+
+class OUTPUTS(str, Enum):
+    str = "str"
+    bytes = "bytes"
+
+
+class RELOADERS(str, Enum):
+    stat = "stat"
+    watch = "watch"
+
+
+class PHASES(str, Enum):
+    preload = "preload"
+    load = "load"
+    prerender = "prerender"
+    parse = "parse"
+    inject = "inject"
+    execute = "execute"
+
+
+class TARGETS(str, Enum):
+    render = "render"
+    stream = "stream"
+    render_async = "render_async"
+    stream_async = "stream_async"
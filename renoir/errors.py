@@ -47,3 +47,10 @@ class TemplateSyntaxError(Exception):
         location = f'File "{self.file_path}", line {self.lineno}'
         lines = [self.args[0], "  " + location]
         return "\n".join(lines)
+
+
+class TemplateBundleError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        self.message = f"Unable to compile {len(errors)} template(s)"
+        super().__init__(self.message)
@@ -15,7 +15,7 @@ from .parsing.lexers import Lexer
 
 
 class MetaExtension(type):
-    _ext_methods_ = {"load", "render", "context"}
+    _ext_methods_ = {"load", "render", "context", "static_context"}
 
     def __new__(cls, name, bases, attrs):
         new_class = type.__new__(cls, name, bases, attrs)
@@ -31,6 +31,7 @@ class MetaExtension(type):
         new_class._ext_all_methods_ = all_methods
         new_class._ext_render_ = "render" in all_methods
         new_class._ext_context_ = "context" in all_methods
+        new_class._ext_static_context_ = "static_context" in all_methods
         return new_class
 
 
@@ -64,3 +65,6 @@ class Extension(metaclass=MetaExtension):
 
     def context(self, context: Dict[str, Any]):
         pass
+
+    def static_context(self) -> Dict[str, Any]:
+        return {}
@@ -10,6 +10,9 @@ Provides helpers.
 """
 
 import traceback
+from array import array
+
+from .constants import CODE_HEADER_LINES
 
 
 class TemplateReference:
@@ -28,7 +31,10 @@ class TemplateReference:
 
     def match_template(self, writer_lineno):
         try:
-            element = self.lines[writer_lineno - 1]
+            idx = writer_lineno - CODE_HEADER_LINES - 1
+            if idx < 0:
+                raise IndexError(idx)
+            element = self.lines[idx]
             reference = (element[0], element[1])
         except Exception:
             reference = (self.parser_ctx.name, ("<unknown>", "unknown"))
@@ -43,6 +49,59 @@ class ParserCtx:
         self.content = content
 
 
+class LineTable:
+    """Maps the lines of compiled templates to the source files and lines."""
+
+    __slots__ = ("sources", "lines")
+
+    def __init__(self, reference):
+        sources, ids = [], {}
+        #: flat pairs of (source index, template line), -1 for unknown lines
+        self.lines = array("i")
+        for source, lines in reference:
+            idx = ids.get(source)
+            if idx is None:
+                idx = ids[source] = len(sources)
+                sources.append(source)
+            lineno = lines[0]
+            self.lines.append(idx)
+            self.lines.append(lineno if isinstance(lineno, int) else -1)
+        self.sources = tuple(sources)
+
+    def __len__(self):
+        return len(self.lines) // 2
+
+    def reference(self):
+        rv = []
+        for idx in range(0, len(self.lines), 2):
+            lineno = self.lines[idx + 1]
+            rv.append((self.sources[self.lines[idx]], (lineno if lineno >= 0 else None, None)))
+        return rv
+
+
+class RenderEvent:
+    __slots__ = ("phase", "name", "elapsed", "cached")
+
+    def __init__(self, phase, name, elapsed, cached=None):
+        self.phase = phase
+        self.name = name
+        self.elapsed = elapsed
+        self.cached = cached
+
+
+class PrecompileReport:
+    __slots__ = ("timings", "failures", "elapsed")
+
+    def __init__(self):
+        self.timings = {}
+        self.failures = {}
+        self.elapsed = 0.0
+
+    @property
+    def compiled(self):
+        return list(self.timings.keys())
+
+
 class adict(dict):
     __setattr__ = dict.__setitem__
     __getattr__ = dict.__getitem__
@@ -11,16 +11,18 @@ Provides structures for templating system.
 
 from __future__ import annotations
 
+import weakref
 from collections.abc import Sequence
 from typing import List, Optional
 
 from .._shortcuts import to_unicode
+from ..compiler import writer_local
 from ..helpers import adict
 
 
 class Element:
     __slots__ = [
-        "ctx",
+        "siblings",
         "idx",
         "text",
         "is_python_block",
@@ -31,10 +33,12 @@ class Element:
         "stripped_head",
         "stripped_tail",
         "reindent_skip",
+        "_str",
     ]
 
-    def __init__(self, ctx: "Elements", idx: int, text: str, is_python_block: bool = False):
-        self.ctx = ctx
+    def __init__(self, siblings: weakref.ref, idx: int, text: str, is_python_block: bool = False):
+        #: a weak reference to the containing elements, to avoid reference cycles
+        self.siblings = siblings
         self.idx = idx
         self.text = text
         self.is_python_block = is_python_block
@@ -45,15 +49,12 @@ class Element:
         self.stripped_head = False
         self.stripped_tail = False
         self.reindent_skip = False
-        if not text:
-            self.strippable_head = False
-            self.strippable_tail = False
-        else:
-            lsplit = text.split("\n", 1)
-            rsplit = text.rsplit("\n", 1)
-            if not lsplit[0].strip(" "):
+        self._str = None
+        if text:
+            head_end = text.find("\n")
+            if not text[: head_end if head_end >= 0 else len(text)].strip(" "):
                 self.strippable_head = True
-            if not rsplit[-1].strip(" "):
+            if not text[text.rfind("\n") + 1 :].strip(" "):
                 self.strippable_tail = True
 
     def prev(self, positions: int = 1) -> Optional["Element"]:
@@ -61,13 +62,13 @@ class Element:
         if idx < 0:
             return None
         try:
-            return self.ctx[idx]
+            return self.siblings()[idx]
         except IndexError:
             return None
 
     def next(self, positions: int = 1) -> Optional["Element"]:
         try:
-            return self.ctx[self.idx + positions]
+            return self.siblings()[self.idx + positions]
         except IndexError:
             return None
 
@@ -88,21 +89,26 @@ class Element:
         if not self.strippable_head:
             return
         self.stripped_head = True
+        self._str = None
 
     def strip_tail(self):
         if not self.strippable_tail:
             return
         self.stripped_tail = True
+        self._str = None
 
     def split(self) -> ElementSplitted:
         return ElementSplitted(self)
 
     def __str__(self) -> str:
-        rv = self.text
-        if self.stripped_tail:
-            rv = rv.rsplit("\n", 1)[0] + "\n"
-        if self.stripped_head:
-            rv = rv.split("\n", 1)[-1]
+        rv = self._str
+        if rv is None:
+            rv = self.text
+            if self.stripped_tail:
+                rv = rv.rsplit("\n", 1)[0] + "\n"
+            if self.stripped_head:
+                rv = rv.split("\n", 1)[-1]
+            self._str = rv
         return rv
 
     def __bool__(self) -> bool:
@@ -113,15 +119,23 @@ class Element:
         return not bool(str(self))
 
 
+class SplittedLine:
+    __slots__ = ["text", "indent", "original_indent", "ignore_reindent", "offset"]
+
+    def __init__(self, text: str, offset: int):
+        self.text = text
+        self.indent = 0
+        self.original_indent = 0
+        self.ignore_reindent = False
+        self.offset = offset
+
+
 class ElementSplitted:
     __slots__ = ["parent", "lines"]
 
     def __init__(self, parent: Element):
         self.parent = parent
-        self.lines = [
-            adict(text=line, indent=0, original_indent=0, ignore_reindent=False, offset=idx)
-            for idx, line in enumerate(self.parent.text.split("\n"))
-        ]
+        self.lines = [SplittedLine(line, idx) for idx, line in enumerate(self.parent.text.split("\n"))]
 
     @property
     def linesn(self) -> int:
@@ -142,12 +156,13 @@ class ElementSplitted:
     def _has_reindent_arbiter(self):
         if self.parent.reindent_skip:
             return False
-        if self.parent.stripped_head and self.parent.idx == self.parent.ctx.strip_arbiter.idx:
+        strip_arbiter = self.parent.siblings().strip_arbiter
+        if self.parent.stripped_head and self.parent.idx == strip_arbiter.idx:
             return True
         rv, prev = False, self.parent.prev(2)
         while prev is not None:
             if prev.stripped_head and not prev.reindent_skip:
-                if prev.idx != self.parent.ctx.strip_arbiter.idx:
+                if prev.idx != strip_arbiter.idx:
                     prev = prev.prev(2)
                 else:
                     rv = prev.can_arbitrate_reindent
@@ -178,10 +193,11 @@ class ElementSplitted:
 
 
 class Elements(Sequence):
-    __slots__ = ["data"]
+    __slots__ = ["data", "__weakref__"]
 
     def __init__(self, elements: List[str]):
         self.data = []
+        ref = weakref.ref(self)
         in_python_block = False
         offsets = [None, None]
         if len(elements) > 1:
@@ -191,7 +207,7 @@ class Elements(Sequence):
             if not elements[-1]:
                 offsets[1] = -1
         for idx, element in enumerate(elements[offsets[0] : offsets[1]]):
-            self.data.append(Element(self, idx, element, in_python_block))
+            self.data.append(Element(ref, idx, element, in_python_block))
             in_python_block = not in_python_block
 
     @property
@@ -214,11 +230,13 @@ class Elements(Sequence):
 
 
 class Content:
-    __slots__ = ["_contents", "_evicted"]
+    __slots__ = ["_contents", "_evicted", "sources"]
 
     def __init__(self):
         self._contents = []
         self._evicted = False
+        #: the elements of the parsed sources, referenced only weakly by the elements themselves
+        self.sources = None
 
     def append(self, element):
         self._contents.append(element)
@@ -232,7 +250,8 @@ class Content:
 
     @property
     def contents(self):
-        return [] if self._evicted else list(self._contents)
+        #: the list is handed over, contents get no updates once their state is closed
+        return [] if self._evicted else self._contents
 
     def render(self, parser):
         return "" if self._evicted else "".join(element.__render__(parser) for element in self._contents)
@@ -312,7 +331,7 @@ class WriterNode(Node):
 
     def __render__(self, parser):
         v = to_unicode(self.render_value())
-        return f"\n{parser.writer}.{self._writer_method}({v})" if v else ""
+        return f"\n{writer_local(parser.writer, self._writer_method)}({v})" if v else ""
 
     def __reference__(self):
         if not to_unicode(self.render_value()):
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+renoir.parsing.fusion
+---------------------
+
+Provides the fusion of consecutive writes in parsed templates.
+
+:copyright: 2014 Giovanni Barillari
+:license: BSD-3-Clause
+"""
+
+from ..compiler import writer_local
+from ..constants import OUTPUTS
+from ..writers import BytesWriter, Writer
+from .contents import HTMLEscapeNode, Node, NodeGroup, PlainNode, WrappedNode, WriterNode
+
+
+_static_nodes = {PlainNode, WrappedNode}
+#: the writer helpers converting values for the fused writes
+_value_nodes = {WriterNode: "text", HTMLEscapeNode: "html"}
+
+
+def fuses_values(writer_cls):
+    #: fused values skip `write` and `escape`, writers customizing them need every value on its own
+    return writer_cls.write in (Writer.write, BytesWriter.write) and writer_cls.escape in (
+        Writer.escape,
+        BytesWriter.escape,
+    )
+
+
+def _calls(expression):
+    #: anything looking like a call or an await might write on its own, and can't follow pending contents
+    return "(" in expression or "await" in expression
+
+
+class WriterFuser:
+    """Merges consecutive static contents and values of the parsed contents
+    into nodes writing them with a single call.
+
+    A run of writes is broken by any other node, by values which might write
+    on their own, and by values coming from a different template line, so
+    every fused write still points to the line of its values.
+    """
+
+    def __init__(self, writer, writer_cls, output=OUTPUTS.str):
+        self.write = writer_local(writer, "write")
+        self.helpers = {helper: writer_local(writer, helper) for helper in _value_nodes.values()}
+        self.binary = output == OUTPUTS.bytes
+        self.values = fuses_values(writer_cls)
+
+    def fuse(self, content):
+        if not content._evicted:
+            content._contents = self.visit(content._contents)
+
+    def visit(self, nodes):
+        rv, run = [], []
+        anchor = None
+        for node in nodes:
+            node_cls = node.__class__
+            if node_cls in _static_nodes:
+                if str(node.value):
+                    run.append((node, None))
+                continue
+            helper = _value_nodes.get(node_cls)
+            if helper is not None and not str(node.value):
+                continue
+            if helper is not None and self.values:
+                expression = str(node.value)
+                reference = (node.source, node.lines[0])
+                if _calls(expression) or (anchor is not None and anchor != reference):
+                    self._flush(run, rv)
+                    run = []
+                anchor = reference
+                run.append((node, helper))
+                continue
+            self._flush(run, rv)
+            run, anchor = [], None
+            if isinstance(node, NodeGroup) and not node._evicted:
+                node.value = self.visit(node.value)
+            rv.append(node)
+        self._flush(run, rv)
+        return rv
+
+    def _flush(self, run, nodes):
+        if not run:
+            return
+        if len(run) == 1 and (run[0][1] is not None or not self.binary):
+            nodes.append(run[0][0])
+            return
+        #: the fused write refers to the line of its values, if any
+        anchor = next((node for node, helper in run if helper is not None), run[0][0])
+        nodes.append(Node(self._write(run), indent=anchor.indent, source=anchor.source, lines=anchor.lines))
+
+    def _write(self, run):
+        if all(helper is None for _, helper in run):
+            data = "".join(str(node.value) for node, _ in run)
+            return f"{self.write}({self._encode(data)!r})"
+        placeholder = "%b" if self.binary else "%s"
+        fmt, args = [], []
+        for node, helper in run:
+            if helper is None:
+                fmt.append(str(node.value).replace("%", "%%"))
+            else:
+                fmt.append(placeholder)
+                args.append(f"{self.helpers[helper]}({node.value})")
+        return f"{self.write}({self._encode(''.join(fmt))!r} % ({', '.join(args)},))"
+
+    def _encode(self, data):
+        return data.encode("utf8") if self.binary else data
@@ -15,8 +15,10 @@ from pathlib import Path
 
 from ..errors import TemplateError
 from .contents import HTMLEscapeNode, PlainNode, WrappedNode, WriterNode
+from .fusion import WriterFuser
 from .lexers import default_lexers
 from .stack import Context, HTMLContext
+from .tokenizer import get_tokenizer
 
 
 class TemplateParser:
@@ -42,18 +44,14 @@ class TemplateParser:
         self.lexers.update(lexers)
         #: configure delimiters
         self.delimiters = delimiters
-        escaped_delimiters = (re.escape(delimiters[0]), re.escape(delimiters[1]))
-        self.r_tag = re.compile(
-            r"((?<!%s)%s.*?%s(?!%s))"
-            % (escaped_delimiters[0][0:2], escaped_delimiters[0], escaped_delimiters[1], escaped_delimiters[1][-2:]),
-            re.DOTALL,
-        )
+        self.tokenizer = get_tokenizer(tuple(delimiters))
+        self.r_tag = self.tokenizer.pattern
         self.delimiters_len = (len(self.delimiters[0]), len(self.delimiters[1]))
         #: build content
         self.parse(text)
 
     def _tag_split_text(self, text):
-        return self.r_tag.split(text.replace("\t", "    "))
+        return self.tokenizer.tokenize(text.replace("\t", "    "))
 
     def _get_file_text(self, ctx, filename, ctxpath=None, strip_ending_new_line=False):
         #: remove quotation from filename string
@@ -89,6 +87,8 @@ class TemplateParser:
 
     #: escape new lines on python comment blocks
     def _escape_python_multiline_newlines(self, text):
+        if '"""' not in text and "'''" not in text:
+            return text
         return re.sub(self.re_multiline, _escape_newlines, text)
 
     def _parse_python_line(self, ctx, element, line):
@@ -155,6 +155,7 @@ class TemplateParser:
         ctx.parse()
         self.content = ctx.content
         self.dependencies = dict(ctx.state.dependencies)
+        WriterFuser(self.writer, self.templater.writer_cls, self.templater.output).fuse(self.content)
 
     def reindent(self, text):
         lines = text.split("\n")
@@ -9,8 +9,8 @@ Provides stack helpers for templates parsing.
 :license: BSD-3-Clause
 """
 
-import uuid
-from collections import namedtuple
+from collections import deque, namedtuple
+from itertools import count
 from pathlib import Path
 
 from .contents import Content, Elements, Node, NodeGroup
@@ -18,6 +18,9 @@ from .contents import Content, Elements, Node, NodeGroup
 
 ParsedLines = namedtuple("ParsedLines", ("start", "end"))
 
+#: states only need identifiers unique within the process
+_state_ids = count()
+
 
 class State:
     __slots__ = [
@@ -39,9 +42,10 @@ class State:
     def __init__(
         self, name, elements, in_python_block=False, parent=None, source=None, line_start=1, blocks=None, **settings
     ):
-        self._id = uuid.uuid4().hex
+        self._id = next(_state_ids)
         self.name = name
-        self.elements = elements
+        #: elements are consumed from the front and shared with the children states
+        self.elements = elements if isinstance(elements, deque) else deque(elements)
         self.in_python_block = in_python_block
         self.parent = parent
         self.source = source
@@ -88,7 +92,7 @@ class State:
 
     def update_lines_count(self, additional_lines, offset=None):
         start = self.lines.end if offset is None else offset
-        self.lines = self.lines._replace(start=start, end=start + additional_lines)
+        self.lines = ParsedLines(start, start + additional_lines)
 
     def __getattr__(self, name):
         return self.settings.get(name)
@@ -99,17 +103,25 @@ class Context:
         self.parser = parser
         self.stack = []
         self.scope = scope
+        self.sources = []
         self.state = State(
             name,
-            Elements(self.parser._tag_split_text(text)).to_list(),
+            self._split(text),
             source=name,
             isolated_pyblockstate=True,
             new_line=False,
         )
+        self.state.content.sources = self.sources
         self.nodes_map = {}
         self._writer_node_cls = writer_node_cls
         self._plain_node_cls = plain_node_cls
 
+    def _split(self, text):
+        elements = Elements(self.parser._tag_split_text(text))
+        #: elements only hold weak references to their container, which is kept alive by the root content
+        self.sources.append(elements)
+        return deque(elements)
+
     @property
     def name(self):
         return self.state.name
@@ -144,10 +156,10 @@ class Context:
         self.state.dependencies[name] = preload_params
         kwargs["source"] = file_path
         kwargs["in_python_block"] = False
-        return self(name=name, elements=Elements(self.parser._tag_split_text(text)).to_list(), **kwargs)
+        return self(name=name, elements=self._split(text), **kwargs)
 
     def end_current_step(self):
-        self.state.elements = []
+        self.state.elements = deque()
 
     def __enter__(self):
         return self
@@ -197,7 +209,7 @@ class Context:
 
     def parse(self):
         while self.elements:
-            element = self.elements.pop(0)
+            element = self.elements.popleft()
             if self.state.in_python_block:
                 self.parser.parse_python_block(self, element)
             else:
@@ -206,7 +218,7 @@ class Context:
 
     def ignore(self):
         while self.elements:
-            element = self.elements.pop(0)
+            element = self.elements.popleft()
             if self.state.in_python_block:
                 self.parser.parse_raw_block(self, element)
             else:
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+renoir.parsing.tokenizer
+------------------------
+
+Provides the tokenizer splitting templates into text and tags.
+
+:copyright: 2014 Giovanni Barillari
+:license: BSD-3-Clause
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+
+class Tokenizer:
+    """Splits sources into alternating text and tag tokens.
+
+    The result is the same of splitting the whole source with the `pattern`
+    regex, but the split stops at the last closing delimiter: past it, every
+    opening delimiter would make the regex scan the rest of the source again,
+    making unterminated tags quadratic.
+    """
+
+    __slots__ = ["closing", "guard_after", "pattern"]
+
+    def __init__(self, delimiters: Tuple[str, str]):
+        self.closing = delimiters[1]
+        escaped = (re.escape(delimiters[0]), re.escape(delimiters[1]))
+        #: closing delimiters can't be followed by this, as in the regex lookahead
+        self.guard_after = _unescape(escaped[1][-2:])
+        self.pattern = re.compile(
+            r"((?<!%s)%s.*?%s(?!%s))" % (escaped[0][0:2], escaped[0], escaped[1], escaped[1][-2:]), re.DOTALL
+        )
+
+    def _last_closing(self, text):
+        closing, guard = self.closing, self.guard_after
+        end = len(text)
+        while True:
+            start = text.rfind(closing, 0, end)
+            if start < 0:
+                return -1
+            if not text.startswith(guard, start + len(closing)):
+                return start + len(closing)
+            end = start + len(closing) - 1
+
+    def tokenize(self, text: str) -> List[str]:
+        end = self._last_closing(text)
+        if end < 0:
+            return [text]
+        rv = self.pattern.split(text[:end])
+        rv[-1] += text[end:]
+        return rv
+
+
+def _unescape(value):
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(delimiters: Tuple[str, str]) -> Tokenizer:
+    return Tokenizer(delimiters)
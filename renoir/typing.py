@@ -9,9 +9,11 @@ Provides typing helpers.
 :license: BSD-3-Clause
 """
 
-from typing import Any, Callable, Dict, Tuple
+from typing import Any, Callable, Dict, Tuple, Union
 
 
 LoaderType = Callable[[str, str], Tuple[str, str]]
 RenderType = Callable[[str, str], str]
 ContextType = Callable[[Dict[str, Any]], None]
+OutputType = Union[str, bytes]
+HookType = Callable[[Any], None]
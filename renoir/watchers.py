@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+renoir.watchers
+---------------
+
+Provides filesystem watchers for templates reloading.
+
+:copyright: 2014 Giovanni Barillari
+:license: BSD-3-Clause
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import threading
+import time
+
+
+def stat_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class PollingWatcher:
+    """Checks the watched files for changes at most once every `interval` seconds."""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.files = {}
+        self._next_check = 0
+        self._lock = threading.Lock()
+
+    def watch(self, file_path):
+        self.files[file_path] = stat_signature(file_path)
+
+    def changes(self):
+        now = time.monotonic()
+        if now < self._next_check or not self._lock.acquire(blocking=False):
+            return []
+        try:
+            self._next_check = now + self.interval
+            rv = []
+            for file_path, signature in list(self.files.items()):
+                if stat_signature(file_path) != signature:
+                    self.files.pop(file_path, None)
+                    rv.append(file_path)
+            return rv
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self.files.clear()
+
+
+class InotifyWatcher:
+    """Watches the directories containing the watched files using inotify."""
+
+    _event = struct.Struct("iIII")
+    #: IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _mask = 0x002 | 0x004 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+    _in_ignored = 0x8000
+    _in_q_overflow = 0x4000
+
+    def __init__(self, interval=0.5):
+        self._libc = _load_libc()
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify initialization failed")
+        self.files = set()
+        self.directories = {}
+        self._watches = {}
+        self._lock = threading.Lock()
+        #: polls the files in directories inotify can't watch, i.e. when the watches limit is reached
+        self.fallback = PollingWatcher(interval)
+
+    def watch(self, file_path):
+        directory = os.path.dirname(file_path)
+        with self._lock:
+            if directory not in self.directories:
+                wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self._mask)
+                if wd < 0:
+                    self.fallback.watch(file_path)
+                    return
+                self.directories[directory] = wd
+                self._watches[wd] = directory
+            self.files.add(file_path)
+            self.fallback.files.pop(file_path, None)
+
+    def _read(self):
+        data = b""
+        while True:
+            try:
+                chunk = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return data
+            if not chunk:
+                return data
+            data += chunk
+
+    def changes(self):
+        rv = set(self.fallback.changes())
+        data = self._read()
+        if not data:
+            return list(rv)
+        offset = 0
+        with self._lock:
+            while offset < len(data):
+                wd, mask, _, length = self._event.unpack_from(data, offset)
+                offset += self._event.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & self._in_q_overflow:
+                    #: events were lost, consider everything changed
+                    rv.update(self.files)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None:
+                    continue
+                if mask & self._in_ignored:
+                    self.directories.pop(directory, None)
+                    self._watches.pop(wd, None)
+                    rv.update(file_path for file_path in self.files if os.path.dirname(file_path) == directory)
+                    continue
+                file_path = os.path.join(directory, os.fsdecode(name))
+                if file_path in self.files:
+                    rv.add(file_path)
+            self.files.difference_update(rv)
+        return list(rv)
+
+    def close(self):
+        self.fallback.close()
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _load_libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def make_watcher(interval=0.5):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(interval)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(interval)
@@ -9,18 +9,34 @@ Provides the writers for the templating system.
 :license: BSD-3-Clause
 """
 
-from io import StringIO
+import threading
 
-from ._shortcuts import htmlescape, to_bytes, to_unicode
+from ._shortcuts import escape_ascii, escape_text, to_unicode
+
+
+#: types which never need escaping
+_plain_types = {int, float, bool, type(None)}
+
+
+class SafeString(str):
+    """A string which won't be escaped by writers."""
+
+    __slots__ = []
+
+    def __html__(self):
+        return self
 
 
 class Writer:
-    def __init__(self):
-        self.body = StringIO()
+    __slots__ = ["body", "_push"]
+
+    def __init__(self, target=None):
+        self.body = []
+        self._push = self.body.append if target is None else target.write
 
     @staticmethod
     def _to_html(data):
-        return htmlescape(data)
+        return escape_text(data)
 
     @staticmethod
     def _to_unicode(data):
@@ -29,9 +45,16 @@ class Writer:
         return to_unicode(data)
 
     def write(self, data):
-        self.body.write(self._to_unicode(data))
+        self._push(data if isinstance(data, str) else to_unicode(data))
 
     def _escape_data(self, data):
+        cls = data.__class__
+        if cls is str:
+            return self._to_html(data)
+        if cls is SafeString:
+            return data
+        if cls in _plain_types:
+            return str(data)
         body = None
         if hasattr(data, "__html__"):
             try:
@@ -45,12 +68,110 @@ class Writer:
     def escape(self, data):
         self.write(self._escape_data(data))
 
+    def text(self, data):
+        return data if isinstance(data, str) else to_unicode(data)
+
+    def html(self, data):
+        return self._to_unicode(self._escape_data(data))
+
+    def getvalue(self):
+        return "".join(self.body)
+
+    def reset(self):
+        self.body.clear()
+
 
 class EscapeAll:
+    __slots__ = []
+
     @staticmethod
     def _to_html(data):
-        return to_bytes(Writer._to_html(data), "ascii", "xmlcharrefreplace")
+        return escape_ascii(escape_text(data))
 
 
 class EscapeAllWriter(EscapeAll, Writer):
-    pass
+    __slots__ = []
+
+
+class BytesWriter(Writer):
+    __slots__ = []
+
+    def __init__(self, target=None):
+        self.body = bytearray()
+        self._push = self.body.extend if target is None else target.write
+
+    def write(self, data):
+        self._push(self.text(data))
+
+    def escape(self, data):
+        self._push(self.html(data))
+
+    def text(self, data):
+        if isinstance(data, str):
+            return data.encode("utf8")
+        return data if isinstance(data, bytes) else str(data).encode("utf8")
+
+    def html(self, data):
+        data = self._escape_data(data)
+        if isinstance(data, str):
+            return data.encode("utf8")
+        return data if isinstance(data, bytes) else to_unicode(data).encode("utf8")
+
+    def getvalue(self):
+        return bytes(self.body)
+
+
+class EscapeAllBytesWriter(EscapeAll, BytesWriter):
+    __slots__ = []
+
+
+class StreamBuffer:
+    __slots__ = ["data", "size"]
+
+    empty = ""
+
+    def __init__(self):
+        self.data = []
+        self.size = 0
+
+    def write(self, data):
+        self.data.append(data)
+        self.size += len(data)
+
+    def flush(self):
+        rv = self.empty.join(self.data)
+        self.data.clear()
+        self.size = 0
+        return rv
+
+
+class BytesStreamBuffer(StreamBuffer):
+    __slots__ = []
+
+    empty = b""
+
+
+class WriterPool:
+    def __init__(self, writer_cls, size=8):
+        self.writer_cls = writer_cls
+        self.size = size
+        self._local = threading.local()
+
+    def _writers(self):
+        try:
+            return self._local.writers
+        except AttributeError:
+            self._local.writers = rv = []
+            return rv
+
+    def acquire(self):
+        writers = self._writers()
+        if writers:
+            return writers.pop()
+        return self.writer_cls()
+
+    def release(self, writer):
+        writer.reset()
+        writers = self._writers()
+        if len(writers) < self.size:
+            writers.append(writer)
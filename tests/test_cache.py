@@ -6,9 +6,20 @@ tests.cache
 Tests cache module.
 """
 
+import asyncio
+import gc
+import os
+import threading
+import time
+
 import pytest
 
 from renoir import Renoir
+from renoir.cli import main
+from renoir.constants import TARGETS
+from renoir.errors import TemplateBundleError, TemplateSyntaxError
+from renoir.helpers import LineTable
+from renoir.watchers import InotifyWatcher
 
 
 @pytest.fixture(scope="function")
@@ -51,3 +62,439 @@ def test_reload(templater_reload):
     templater_reload._render(source="{{=a}}\n", context={"a": 1})
     assert templater_reload.cache.parse.hashes["<string>"] != hashed
     assert templater_reload.cache.parse.data["<string>"] is not data
+
+
+def test_bounded_entries(tmp_path):
+    (tmp_path / "layout.html").write_text("<main>{{include}}</main>")
+    for name in ["a", "b", "c"]:
+        (tmp_path / f"{name}.html").write_text('{{extend "layout.html"}}' + name)
+    templater = Renoir(path=str(tmp_path), reload=True, cache_max_entries=2)
+    cache = templater.cache
+
+    assert templater.render("a.html") == "<main>a</main>"
+    assert templater.render("b.html") == "<main>b</main>"
+    assert templater.render("a.html") == "<main>a</main>"
+    assert templater.render("c.html") == "<main>c</main>"
+    a_path, b_path, c_path = [str(tmp_path / f"{name}.html") for name in ["a", "b", "c"]]
+    assert list(cache.parse.data) == [a_path, c_path]
+    for layer in [cache.parse.hashes, cache.parse.dependencies, cache.parse.files]:
+        assert set(layer) == {a_path, c_path}
+    assert len(cache.load.data) == 2
+    assert set(cache.load.mtimes) == set(cache.load.data)
+    assert set(cache.prerender.hashes) == set(cache.prerender.data)
+
+    #: dependencies evicted from the loader still get checked
+    cache.load.discard(str(tmp_path / "layout.html"))
+    code = cache.parse.data[a_path]
+    assert templater.render("a.html") == "<main>a</main>"
+    assert cache.parse.data[a_path] is not code
+    assert templater.render("b.html") == "<main>b</main>"
+
+
+def test_bounded_bytes(tmp_path):
+    for name in ["a", "b", "c"]:
+        (tmp_path / f"{name}.html").write_text(name * 1000)
+    templater = Renoir(path=str(tmp_path), cache_max_bytes=2500)
+    cache = templater.cache
+
+    for name in ["a", "b", "c"]:
+        assert templater.render(f"{name}.html") == name * 1000
+    assert list(cache.load.data) == [str(tmp_path / f"{name}.html") for name in ["b", "c"]]
+    assert cache.load.size <= 2500
+    assert cache.load.size == sum(cache.load.sizes.values())
+    assert set(cache.parse.sizes) == set(cache.parse.data)
+
+    templater = Renoir(path=str(tmp_path), cache_max_bytes=10)
+    assert templater.render("a.html") == "a" * 1000
+    assert len(templater.cache.load.data) == 1
+
+
+def test_stats(tmp_path):
+    (tmp_path / "a.html").write_text("{{=a}}")
+    templater = Renoir(path=str(tmp_path), reload=True, cache_max_entries=1)
+    templater.render("a.html", {"a": 1})
+    templater.render("a.html", {"a": 1})
+    stats = templater.cache.stats()
+    assert set(stats) == {"load", "prerender", "parse"}
+    for layer in stats.values():
+        assert layer["entries"] == 1
+        assert layer["hits"] == 1
+        assert layer["misses"] == 1
+        assert layer["invalidations"] == 0
+        assert layer["retained_bytes"] > 0
+    assert stats["parse"]["compile_time"] > 0
+
+    (tmp_path / "a.html").write_text("{{=a}}!")
+    templater.cache.load.mtimes[str(tmp_path / "a.html")] = 0
+    templater._render(source="{{=a}}", file_path="b.html", context={"a": 1})
+    assert templater.render("a.html", {"a": 1}) == "1!"
+    stats = templater.cache.stats()
+    assert stats["load"]["invalidations"] == 1
+    assert stats["prerender"]["invalidations"] == 1
+    assert stats["parse"]["invalidations"] == 0
+    assert stats["parse"]["evictions"] == 2
+
+    templater.cache.reset_stats()
+    stats = templater.cache.stats()
+    assert stats["parse"]["hits"] == stats["parse"]["misses"] == stats["parse"]["evictions"] == 0
+    assert stats["parse"]["compile_time"] == 0
+    assert stats["parse"]["entries"] == 1
+
+
+def test_stats_unbounded(tmp_path):
+    (tmp_path / "a.html").write_text("{{=a}}")
+    templater = Renoir(path=str(tmp_path))
+    templater.render("a.html", {"a": 1})
+    size = templater.cache.stats()["parse"]["retained_bytes"]
+    assert size == sum(templater.cache.parse.sizes.values()) > 0
+    templater.cache.invalidate(str(tmp_path / "a.html"))
+    assert templater.cache.stats()["parse"]["retained_bytes"] == 0
+
+    errors, done = [], threading.Event()
+
+    def collect():
+        while not done.is_set():
+            try:
+                templater.cache.stats()
+            except Exception as exc:
+                errors.append(exc)
+
+    thread = threading.Thread(target=collect)
+    thread.start()
+    for idx in range(200):
+        templater._render(source="{{=a}}", file_path=f"{idx}.html", context={"a": 1})
+    done.set()
+    thread.join()
+    assert not errors
+
+
+def test_reload_hashing(tmp_path, monkeypatch):
+    from renoir import cache as cache_module
+
+    (tmp_path / "layout.html").write_text("<main>{{include}}</main>")
+    (tmp_path / "a.html").write_text('{{extend "layout.html"}}a')
+    templater = Renoir(path=str(tmp_path), reload=True)
+    assert templater.render("a.html") == "<main>a</main>"
+
+    hashed = []
+    make_hash = cache_module.make_hash
+    monkeypatch.setattr(cache_module, "make_hash", lambda value: hashed.append(value) or make_hash(value))
+    assert templater.render("a.html") == "<main>a</main>"
+    assert not hashed
+
+    #: sources not coming from the loader still get hashed
+    templater._render(source="{{=a}}", context={"a": 1})
+    hashed.clear()
+    assert templater._render(source="".join(["{{=", "a}}"]), context={"a": 2}) == "2"
+    assert hashed
+
+
+def test_reload_watch(tmp_path, monkeypatch):
+    (tmp_path / "layout.html").write_text("<main>{{include}}</main>")
+    (tmp_path / "_header.html").write_text("header")
+    (tmp_path / "a.html").write_text('{{extend "layout.html"}}{{include "_header.html"}}a')
+    (tmp_path / "b.html").write_text('{{extend "layout.html"}}b')
+    templater = Renoir(path=str(tmp_path), reload=True, reload_backend="watch", reload_interval=0)
+    cache = templater.cache
+    assert templater.render("a.html") == "<main>headera</main>"
+    assert templater.render("b.html") == "<main>b</main>"
+    a_path, b_path = str(tmp_path / "a.html"), str(tmp_path / "b.html")
+    b_code = cache.parse.data[b_path]
+
+    stats = []
+    stat = os.stat
+    monkeypatch.setattr(os, "stat", lambda *args, **kwargs: stats.append(args) or stat(*args, **kwargs))
+    assert templater.render("a.html") == "<main>headera</main>"
+    if isinstance(cache.watcher, InotifyWatcher):
+        assert not stats
+    monkeypatch.undo()
+
+    (tmp_path / "_header.html").write_text("new header")
+    assert templater.render("a.html") == "<main>new headera</main>"
+    assert templater.render("b.html") == "<main>b</main>"
+    assert cache.parse.data[b_path] is b_code
+    assert cache.stats()["parse"]["invalidations"] == 1
+    cache.watcher.close()
+
+
+class FailingLibc:
+    #: simulates the exhaustion of the inotify watches
+    def inotify_add_watch(self, fd, path, mask):
+        return -1
+
+
+def test_reload_watch_fallback(tmp_path):
+    (tmp_path / "a.html").write_text("a")
+    templater = Renoir(path=str(tmp_path), reload=True, reload_backend="watch", reload_interval=0)
+    watcher = templater.cache.watcher
+    if not isinstance(watcher, InotifyWatcher):
+        pytest.skip("inotify not available")
+    watcher._libc = FailingLibc()
+    assert templater.render("a.html") == "a"
+    (tmp_path / "a.html").write_text("new a")
+    assert templater.render("a.html") == "new a"
+    watcher.close()
+
+
+def test_reload_dependents(tmp_path):
+    (tmp_path / "layout.html").write_text('{{include "_header.html"}}<main>{{include}}</main>')
+    (tmp_path / "_header.html").write_text("header")
+    (tmp_path / "a.html").write_text('{{extend "layout.html"}}a')
+    (tmp_path / "b.html").write_text("b")
+    templater = Renoir(path=str(tmp_path), reload=True)
+    cache = templater.cache
+    assert templater.render("a.html") == "header<main>a</main>"
+    assert templater.render("b.html") == "b"
+    a_path, b_path = str(tmp_path / "a.html"), str(tmp_path / "b.html")
+    header_path = str(tmp_path / "_header.html")
+    assert cache.dependents(header_path) == {a_path}
+    assert cache.dependents(str(tmp_path / "layout.html")) == {a_path}
+    assert cache.dependents(b_path) == {b_path}
+
+    b_code = cache.parse.data[b_path]
+    cache.invalidate(header_path)
+    assert a_path not in cache.parse.data
+    assert cache.parse.data[b_path] is b_code
+    assert not cache.dependents(header_path)
+
+    (tmp_path / "_header.html").write_text("new header")
+    assert templater.render("a.html") == "new header<main>a</main>"
+    assert cache.dependents(header_path) == {a_path}
+
+
+def test_single_flight(tmp_path):
+    (tmp_path / "a.html").write_text("{{=a}}")
+    templater = Renoir(path=str(tmp_path), reload=True)
+    parse, calls = templater._parse, []
+
+    def slow_parse(*args, **kwargs):
+        calls.append(args[0])
+        time.sleep(0.05)
+        return parse(*args, **kwargs)
+
+    templater._parse = slow_parse
+    barrier, results = threading.Barrier(8), []
+
+    def render(value):
+        barrier.wait()
+        results.append(templater.render("a.html", {"a": value}))
+
+    threads = [threading.Thread(target=render, args=(idx,)) for idx in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [str(idx) for idx in range(8)]
+    assert calls == [str(tmp_path / "a.html")]
+
+    #: callers missing the cache before the publication don't build the entry again
+    file_path = str(tmp_path / "a.html")
+    source = templater.cache.load.data[file_path]
+    entry = templater.cache.parse.data[file_path]
+    assert templater.cache.parse.flight(file_path, source, calls.append, "again") is entry
+    assert templater.cache.parse.flight(file_path, "{{=b}}", lambda: "rebuilt") == "rebuilt"
+    assert calls == [file_path]
+
+
+def test_line_table(tmp_path):
+    (tmp_path / "page.html").write_text('foo\n{{include "_part.html"}}\n{{=a}}')
+    (tmp_path / "_part.html").write_text("bar\n{{=1/a}}")
+    templater = Renoir(path=str(tmp_path))
+    page_path, part_path = str(tmp_path / "page.html"), str(tmp_path / "_part.html")
+    assert templater.render("page.html", {"a": 1}) == "foo\nbar\n1.0\n1"
+    _, lines = templater.cache.parse.data[page_path]
+    assert isinstance(lines, LineTable)
+    assert set(lines.sources) == {page_path, part_path}
+
+    for _ in range(2):
+        with pytest.raises(ZeroDivisionError) as exc:
+            templater.render("page.html", {"a": 0})
+        assert str(exc.traceback[-1].path) == part_path
+        assert exc.traceback[-1].lineno + 1 == 2
+
+
+def test_bytecode(tmp_path):
+    templates, cache_path = tmp_path / "templates", tmp_path / "cache"
+    templates.mkdir()
+    (templates / "page.html").write_text("{{include '_part.html'}}{{=a}}")
+    (templates / "_part.html").write_text("part ")
+
+    templater = Renoir(path=str(templates), cache_path=str(cache_path))
+    assert templater.render("page.html", {"a": 1}) == "part 1"
+    assert len(list(cache_path.iterdir())) == 1
+
+    templater = Renoir(path=str(templates), cache_path=str(cache_path))
+    templater.parser_cls = None
+    assert templater.render("page.html", {"a": 2}) == "part 2"
+
+
+def test_bytecode_invalidation(tmp_path):
+    templates, cache_path = tmp_path / "templates", tmp_path / "cache"
+    templates.mkdir()
+    (templates / "page.html").write_text("{{include '_part.html'}}{{=a}}")
+    (templates / "_part.html").write_text("part ")
+    Renoir(path=str(templates), cache_path=str(cache_path)).render("page.html", {"a": 1})
+
+    (templates / "_part.html").write_text("changed ")
+    templater = Renoir(path=str(templates), cache_path=str(cache_path))
+    assert templater.render("page.html", {"a": 1}) == "changed 1"
+
+    (templates / "page.html").write_text("{{=a}}")
+    templater = Renoir(path=str(templates), cache_path=str(cache_path))
+    assert templater.render("page.html", {"a": 1}) == "1"
+
+    templater = Renoir(path=str(templates), cache_path=str(cache_path), mode="plain")
+    assert templater.cache.bytecode.get(str(templates / "page.html"), "{{=a}}", TARGETS.render) == (None, None, None)
+
+
+def test_bytecode_errors(tmp_path):
+    templates, cache_path = tmp_path / "templates", tmp_path / "cache"
+    templates.mkdir()
+    (templates / "page.html").write_text("foo\n{{=1/0}}")
+    Renoir(path=str(templates), cache_path=str(cache_path)).parse(str(templates / "page.html"), "foo\n{{=1/0}}", {})
+
+    templater = Renoir(path=str(templates), cache_path=str(cache_path))
+    templater.parser_cls = None
+    with pytest.raises(ZeroDivisionError) as exc:
+        templater.render("page.html")
+
+    tb = exc.tb
+    while tb.tb_next:
+        tb = tb.tb_next
+    assert exc.traceback[-1].name == "template"
+    assert str(exc.traceback[-1].path).endswith("page.html")
+    assert tb.tb_lineno == 2
+
+
+def test_bundle(tmp_path):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "html")
+    bundle_path = str(tmp_path / "templates.bundle")
+    context = {"posts": [{"title": "foo"}, {"title": "bar"}]}
+
+    templater = Renoir(path=path)
+    skipped = templater.compile_bundle(bundle_path)
+    assert set(skipped.keys()) == {"layout.html"}
+    rendered = templater.render("test.html", dict(context))
+
+    templater = Renoir(path=path)
+    templater.load_bundle(bundle_path)
+    templater.parser_cls = None
+    templater._load = None
+    assert templater.render("test.html", dict(context)) == rendered
+
+    with pytest.raises(RuntimeError):
+        Renoir(path=path, mode="plain").load_bundle(bundle_path)
+
+
+def test_bundle_errors(tmp_path):
+    (tmp_path / "page.html").write_text("{{if True:}}\n{{=a b}}\n{{pass}}")
+    with pytest.raises(TemplateBundleError) as exc:
+        Renoir(path=str(tmp_path)).compile_bundle(str(tmp_path / "templates.bundle"))
+    assert exc.value.errors["page.html"].lineno == 2
+    assert not (tmp_path / "templates.bundle").exists()
+
+
+def test_bundle_async(tmp_path):
+    (tmp_path / "page.html").write_text("{{=await value()}}")
+    bundle_path = str(tmp_path / "templates.bundle")
+    assert main(["compile", str(tmp_path), "-o", bundle_path, "--mode", "plain"]) == 0
+
+    async def value():
+        return 1
+
+    templater = Renoir(path=str(tmp_path), mode="plain")
+    templater.load_bundle(bundle_path)
+    codes, _ = templater.cache.bundle[str(tmp_path / "page.html")]
+    assert set(codes) == {TARGETS.render_async, TARGETS.stream_async}
+    assert asyncio.run(templater.render_async("page.html", {"value": value})) == "1"
+    with pytest.raises(TemplateSyntaxError):
+        templater.render("page.html", {"value": value})
+
+
+def test_bundle_cli(tmp_path):
+    (tmp_path / "page.html").write_text("{{=a}}")
+    bundle_path = str(tmp_path / "templates.bundle")
+    assert main(["compile", str(tmp_path), "-o", bundle_path, "--mode", "plain"]) == 0
+
+    templater = Renoir(path=str(tmp_path), mode="plain")
+    templater.load_bundle(bundle_path)
+    assert str(tmp_path / "page.html") in templater.cache.bundle
+
+
+def test_precompile():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "html")
+    templater = Renoir(path=path)
+    report = templater.precompile(workers=2)
+    assert set(report.failures.keys()) == {"layout.html"}
+    assert set(report.failures["layout.html"]) == {TARGETS.render}
+    assert set(report.compiled) == {
+        "_footer.html",
+        "_header.html",
+        "pre.html",
+        "pyerror.html",
+        "test.html",
+        "test2.html",
+    }
+    assert report.elapsed > 0
+    for name in report.compiled:
+        file_path = os.path.join(path, name)
+        assert templater.cache.load.data[file_path]
+        assert templater.cache.prerender.data[file_path]
+        assert templater.cache.parse.data[file_path]
+
+    templater.parser_cls = None
+    assert templater.render("test.html", {"posts": []})
+
+
+def test_precompile_pattern():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "html")
+    templater = Renoir(path=path)
+    report = templater.precompile("test*.html")
+    assert not report.failures
+    assert set(report.compiled) == {"test.html", "test2.html"}
+    assert set(templater.cache.parse.data.keys()) == {os.path.join(path, "test.html"), os.path.join(path, "test2.html")}
+
+
+def test_freeze(tmp_path):
+    (tmp_path / "a.html").write_text("{{=a}}")
+    (tmp_path / "b.html").write_text("b")
+    templater = Renoir(path=str(tmp_path), reload=True, cache_max_entries=1)
+    try:
+        report = templater.freeze()
+    finally:
+        gc.unfreeze()
+    assert not report.failures
+    assert set(report.compiled) == {"a.html", "b.html"}
+    for cache in templater.cache.targets.values():
+        assert len(cache.data) == 2
+        assert not cache.hashes and not cache.sources and not cache.files and not cache.reverse_dependencies
+    assert not templater.cache.load.mtimes and not templater.cache.prerender.hashes
+
+    (tmp_path / "a.html").write_text("changed")
+    templater.cache.reset_stats()
+    assert templater.render("a.html", {"a": 1}) == "1"
+    assert "".join(templater.stream("b.html")) == "b"
+    assert templater.render("b.html") == "b"
+    stats = templater.cache.stats()
+    assert stats["parse"]["misses"] == 0
+    assert stats["parse"]["entries"] == 2 * len(TARGETS)
+
+    #: templates missing from the frozen cache are still stored, without tracking changes
+    (tmp_path / "c.html").write_text("c")
+    assert templater.render("c.html") == "c"
+    assert templater.cache.parse.data[str(tmp_path / "c.html")]
+    assert not templater.cache.parse.hashes and not templater.cache.load.mtimes
+
+
+def test_freeze_async(tmp_path):
+    (tmp_path / "a.html").write_text("{{=await value()}}")
+    templater = Renoir(path=str(tmp_path))
+    try:
+        report = templater.freeze()
+    finally:
+        gc.unfreeze()
+    assert report.compiled == ["a.html"]
+    assert set(report.failures["a.html"]) == {TARGETS.render, TARGETS.stream}
+    assert all(isinstance(exc, TemplateSyntaxError) for exc in report.failures["a.html"].values())
+    for target in TARGETS:
+        assert len(templater.cache.targets[target].data) == (target in (TARGETS.render_async, TARGETS.stream_async))
@@ -35,6 +35,20 @@ class BarExtension(Extension):
         context["bar"] = True
 
 
+class BazExtension(Extension):
+    namespace = "baz"
+
+    def on_load(self):
+        self.env.calls = 0
+
+    def static_context(self):
+        self.env.calls += 1
+        return {"baz": self.gen_baz, "qux": 1}
+
+    def gen_baz(self, value):
+        return f"baz{value}"
+
+
 @pytest.fixture(scope="function")
 def templater():
     rv = Renoir()
@@ -66,6 +80,8 @@ def test_load(templater):
 def test_render(templater):
     source = templater.prerender("test", "<string>")
     assert source == "testfoo"
+    source = templater.prerender("test", "<string>")
+    assert source == "testfoo"
 
 
 def test_context(templater):
@@ -74,7 +90,21 @@ def test_context(templater):
     assert ctx["foo"] is False
     assert ctx["bar"] is True
 
+    ctx = {"foo": False}
+    assert templater._render(source="{{=foo}} {{=bar}}", context=ctx) == "False True"
+    assert ctx == {"foo": False}
+
 
 def test_lexers(templater):
     r = templater._render(source="{{foo asd}}")
     assert r == "asdasd"
+
+
+def test_static_context(templater):
+    ext = templater.use_extension(BazExtension)
+    assert templater.contexts[0].__self__.__class__ == BarExtension
+    ctx = {"a": 1}
+    assert templater._render(source="{{=baz(a)}} {{=qux}} {{=bar}}", context=ctx) == "baz1 1 True"
+    assert templater._render(source="{{=qux}}", file_path="qux", context={"qux": 2}) == "2"
+    assert ctx == {"a": 1}
+    assert ext.env.calls == 1
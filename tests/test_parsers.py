@@ -6,12 +6,15 @@ tests.parser
 Tests parser module.
 """
 
+import gc
+import random
 import sys
 import traceback
 
 import pytest
 
 from renoir import Renoir
+from renoir.parsing.tokenizer import get_tokenizer
 
 
 @pytest.fixture(scope="function")
@@ -109,3 +112,38 @@ def test_python_errors(templater_plain):
     assert tb_frame.tb_lineno == 2
 
     assert '<string>", line 2, in template' in tbs
+
+
+def test_many_tags(ptemplater_plain):
+    source = "{{block a}}{{for i in range(2):}}{{=i}}{{pass}}{{end}}\n" * 1000
+    r = ptemplater_plain._render(source=source)
+    assert r.splitlines() == ["01"] * 1000
+
+
+def test_no_reference_cycles(ptemplater_plain):
+    source = "<p>\n  {{block a}}\n  {{for i in range(2):}}\n    {{=i}}\n  {{pass}}\n  {{end}}\n</p>\n" * 10
+    gc.collect()
+    parser = ptemplater_plain._build_parser("test", source, {})
+    parser.render()
+    parser.content.reference()
+    del parser
+    assert gc.collect() == 0
+
+
+@pytest.mark.parametrize("delimiters", [("{{", "}}"), ("[[", "]]"), ("<%", "%>")])
+def test_tokenizer(delimiters):
+    tokenizer = get_tokenizer(delimiters)
+    assert get_tokenizer(delimiters) is tokenizer
+    alphabet = "".join(set("".join(delimiters))) + "a\n"
+    #: deterministic seed, the generator is only used to fuzz the tokenizer
+    rnd = random.Random(42)  # noqa: S311
+    for _ in range(5000):
+        text = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 16)))
+        assert tokenizer.tokenize(text) == tokenizer.pattern.split(text)
+
+
+def test_unterminated_tags(templater_plain):
+    source = "<p>{{ a\n" * 20000
+    assert templater_plain._render(source=source) == source
+    source = "{{=a}}" + "<p>{{ a\n" * 20000
+    assert templater_plain._render(source=source, file_path="mixed", context={"a": 1}) == "1" + "<p>{{ a\n" * 20000
@@ -6,6 +6,8 @@ tests.templater
 Tests templater module.
 """
 
+import asyncio
+import io
 import os
 import traceback
 
@@ -13,6 +15,7 @@ import pytest
 import yaml
 
 from renoir import Renoir
+from renoir.errors import TemplateSyntaxError
 
 
 @pytest.fixture(scope="function")
@@ -362,3 +365,170 @@ parent l2"""
 def test_blocks_include_multi(templater_blocks):
     r = templater_blocks.render("child_multi_incl.txt", {"condition": True})
     assert "\n".join(filter(None, [l.rstrip() for l in r.splitlines()])) == _target_b3[1:]
+
+
+def test_render_into(templater_html):
+    context = {"posts": [{"title": "foo"}, {"title": "bar"}]}
+    buffer = io.StringIO()
+    templater_html.render_into("test.html", buffer, dict(context))
+    assert buffer.getvalue() == templater_html.render("test.html", dict(context))
+
+
+def test_stream(templater_html):
+    context = {"posts": [{"title": "foo"}, {"title": "bar"}]}
+    chunks = list(templater_html.stream("test.html", dict(context), chunk_size=64))
+    assert "".join(chunks) == templater_html.render("test.html", dict(context))
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 64 for chunk in chunks[:-1])
+
+
+def test_stream_incremental(templater_html):
+    calls = []
+    stream = templater_html._stream(
+        source="<head></head>\n{{calls.append(1)}}{{x = 2}}{{def foo():}}<b>{{=x}}</b>{{return}}{{foo()}}",
+        context={"calls": calls},
+        chunk_size=1,
+    )
+    assert next(stream) == "<head></head>\n"
+    assert not calls
+    assert "".join(stream) == "<b>2</b>"
+    assert calls == [1]
+
+
+def test_stream_dynamic_scope(templater_html):
+    source = "{{title = locals().get('title', 'none')}}{{=title}}"
+    assert list(templater_html._stream(source=source, chunk_size=2)) == ["no", "ne"]
+
+
+def test_function_scope(templater_html):
+    cases = [
+        ("{{a = a + 1}}{{=a}}", {"a": 1}, "2"),
+        ("{{if False:}}{{a = 2}}{{pass}}{{=a}}", {"a": 1}, "1"),
+        ("{{for i in range(3):}}{{=i}}{{pass}}{{=i}}", {}, "0122"),
+        ("{{b = 3}}{{=[i * b for i in range(a)]}}", {"a": 2}, "[0, 3]"),
+        ("{{def f():}}{{global a}}{{a = 7}}{{return}}{{f()}}{{=a}}", {"a": 1}, "7"),
+        ("{{for id in [4]:}}{{pass}}{{=id}}", {}, "4"),
+        ("{{try:}}{{=missing}}{{except NameError:}}missing{{pass}}", {}, "missing"),
+        ("{{=locals().get('a')}}", {"a": 1}, "1"),
+    ]
+    for source, context, expected in cases:
+        assert templater_html._render(source=source, file_path=source, context=context) == expected
+
+
+def test_function_scope_missing(templater_html):
+    for source in ["{{=missing}}", "{{for i in range(2):}}{{=missing}}{{pass}}", "{{=[missing for i in range(1)]}}"]:
+        with pytest.raises(NameError) as exc:
+            templater_html._render(source=source, file_path=source, context={})
+        assert exc.type is NameError
+        assert str(exc.value) == "name 'missing' is not defined"
+
+
+def test_function_scope_context(templater_html):
+    context = {"a": 1}
+    assert templater_html._render(source="{{b = a}}{{=b}}", context=context) == "1"
+    assert "b" not in context
+
+    assert "".join(templater_html._stream(source="{{=a}}", context=context)) == "1"
+    assert asyncio.run(templater_html._render_async(source="{{exec('c = 1')}}{{=a}}", context=context)) == "1"
+    assert context == {"a": 1}
+
+
+def test_bytes_output():
+    templater = Renoir(output="bytes")
+    source = "<p>100% à {{=a}}</p>{{for i in range(2):}}<b>{{=i}}</b>{{pass}}{{=b}}"
+    context = {"a": "<è>", "b": b"raw"}
+    expected = "<p>100% à &lt;è&gt;</p><b>0</b><b>1</b>raw".encode("utf8")
+    assert templater._render(source=source, context=dict(context)) == expected
+    assert b"".join(templater._stream(source=source, context=dict(context), chunk_size=1)) == expected
+    assert asyncio.run(templater._render_async(source=source, context=dict(context))) == expected
+
+    templater = Renoir(output="bytes", escape="all")
+    assert templater._render(source="{{=a}}", context={"a": "<è>"}) == b"&lt;&#232;&gt;"
+
+
+def test_hooks(templater_html):
+    events = []
+    templater = Renoir(path=templater_html.path, hooks=[events.append])
+    context = {"posts": [{"title": "foo"}]}
+    templater.render("test.html", dict(context))
+    phases = [event.phase for event in events]
+    assert phases[0] == "preload" and events[0].name == "test.html"
+    for phase in ["load", "prerender", "parse", "inject", "execute"]:
+        assert phase in phases
+    assert all(event.elapsed >= 0 for event in events)
+    assert not [event for event in events if event.phase == "parse"][0].cached
+
+    events.clear()
+    templater.render("test.html", dict(context))
+    assert [event.cached for event in events if event.phase in ("load", "prerender", "parse")] == [True] * 3
+
+    events.clear()
+    assert "".join(templater.stream("test.html", dict(context))) == templater_html.render("test.html", dict(context))
+    assert events[-1].phase == "execute"
+
+    events.clear()
+    with pytest.raises(ZeroDivisionError) as exc:
+        templater.render("pyerror.html")
+    assert exc.traceback[-1].lineno + 1 == 2
+    assert events[-1].phase == "execute"
+
+
+def test_stream_pyerror(templater_html):
+    with pytest.raises(ZeroDivisionError) as exc:
+        list(templater_html.stream("pyerror.html"))
+
+    tb = exc.tb
+    while tb.tb_next:
+        tb = tb.tb_next
+    assert exc.traceback[-1].name == "template"
+    assert str(exc.traceback[-1].path).endswith(os.sep.join(["html", "pyerror.html"]))
+    assert tb.tb_lineno == 2
+
+
+async def _fetch(value):
+    await asyncio.sleep(0)
+    return value
+
+
+async def _iterate(values):
+    for value in values:
+        await asyncio.sleep(0)
+        yield value
+
+
+_async_source = "<ul>\n{{async for item in _iterate(items):}}<li>{{=await _fetch(item)}}</li>\n{{pass}}</ul>"
+
+
+def test_render_async(templater_html):
+    context = {"items": ["a", "b"], "_iterate": _iterate, "_fetch": _fetch}
+    r = asyncio.run(templater_html._render_async(source=_async_source, context=context))
+    assert r == "<ul>\n<li>a</li>\n<li>b</li>\n</ul>"
+    r = asyncio.run(templater_html.render_async("test2.html", {"posts": [{"title": "foo"}]}))
+    assert r == templater_html.render("test2.html", {"posts": [{"title": "foo"}]})
+
+    with pytest.raises(TemplateSyntaxError):
+        templater_html._render(source=_async_source, context=context)
+
+
+def test_stream_async(templater_html):
+    context = {"items": ["a", "b"], "_iterate": _iterate, "_fetch": _fetch}
+
+    async def consume():
+        return [chunk async for chunk in templater_html._stream_async(_async_source, context=context, chunk_size=4)]
+
+    chunks = asyncio.run(consume())
+    assert chunks[0] == "<ul>\n"
+    assert "".join(chunks) == "<ul>\n<li>a</li>\n<li>b</li>\n</ul>"
+    assert all(len(chunk) >= 4 for chunk in chunks[:-1])
+
+
+def test_render_async_pyerror(templater_html):
+    with pytest.raises(ZeroDivisionError) as exc:
+        asyncio.run(templater_html.render_async("pyerror.html"))
+
+    tb = exc.tb
+    while tb.tb_next:
+        tb = tb.tb_next
+    assert exc.traceback[-1].name == "template"
+    assert str(exc.traceback[-1].path).endswith(os.sep.join(["html", "pyerror.html"]))
+    assert tb.tb_lineno == 2
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+tests.watchers
+--------------
+
+Tests watchers module.
+"""
+
+import os
+
+import pytest
+
+from renoir.watchers import InotifyWatcher, PollingWatcher
+
+
+def _inotify_watcher():
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError):
+        pytest.skip("inotify not available")
+
+
+@pytest.fixture(params=["polling", "inotify"])
+def watcher(request):
+    rv = PollingWatcher(interval=0) if request.param == "polling" else _inotify_watcher()
+    yield rv
+    rv.close()
+
+
+def test_watcher(tmp_path, watcher):
+    file_a, file_b = str(tmp_path / "a.html"), str(tmp_path / "b.html")
+    for file_path in [file_a, file_b]:
+        with open(file_path, "w") as file_obj:
+            file_obj.write("foo")
+    watcher.watch(file_a)
+    watcher.watch(file_b)
+    assert watcher.changes() == []
+
+    with open(file_a, "w") as file_obj:
+        file_obj.write("foobar")
+    assert watcher.changes() == [file_a]
+    assert watcher.changes() == []
+
+    watcher.watch(file_a)
+    with open(file_b + ".tmp", "w") as file_obj:
+        file_obj.write("bar")
+    os.replace(file_b + ".tmp", file_b)
+    assert watcher.changes() == [file_b]
+
+
+def test_polling_interval(tmp_path):
+    file_path = str(tmp_path / "a.html")
+    with open(file_path, "w") as file_obj:
+        file_obj.write("foo")
+    watcher = PollingWatcher(interval=3600)
+    watcher.watch(file_path)
+    assert watcher.changes() == []
+    with open(file_path, "w") as file_obj:
+        file_obj.write("foobar")
+    assert watcher.changes() == []
+
+
+class FailingLibc:
+    #: simulates the exhaustion of the inotify watches
+    def inotify_add_watch(self, fd, path, mask):
+        return -1
+
+
+def test_inotify_fallback(tmp_path):
+    watcher = _inotify_watcher()
+    watcher.fallback.interval = 0
+    watcher._libc = FailingLibc()
+    file_path = str(tmp_path / "a.html")
+    with open(file_path, "w") as file_obj:
+        file_obj.write("foo")
+    watcher.watch(file_path)
+    assert not watcher.directories
+    assert watcher.changes() == []
+
+    with open(file_path, "w") as file_obj:
+        file_obj.write("foobar")
+    assert watcher.changes() == [file_path]
+    watcher.close()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+tests.writers
+-------------
+
+Tests writers module.
+"""
+
+import threading
+
+import pytest
+
+from renoir import Renoir, SafeString
+from renoir.writers import (
+    BytesStreamBuffer,
+    BytesWriter,
+    EscapeAllBytesWriter,
+    EscapeAllWriter,
+    StreamBuffer,
+    Writer,
+    WriterPool,
+)
+
+
+class UpperWriter(Writer):
+    def write(self, data):
+        super().write(str(data).upper())
+
+
+def test_writer():
+    writer = Writer()
+    writer.write("foo")
+    writer.write(b"bar")
+    writer.escape("<a>")
+    assert writer.getvalue() == "foobar&lt;a&gt;"
+    writer.reset()
+    assert writer.getvalue() == ""
+
+    writer = EscapeAllWriter()
+    writer.escape("nuvolosità")
+    assert writer.getvalue() == "nuvolosit&#224;"
+
+
+def test_writer_escape():
+    writer = Writer()
+    assert writer.html("<a href=\"/\" title='&'>") == "&lt;a href=&quot;/&quot; title=&#x27;&amp;&#x27;&gt;"
+    assert writer.html(1) == "1"
+    assert writer.html(1.5) == "1.5"
+    assert writer.html(True) == "True"
+    assert writer.html(None) == "None"
+    assert writer.html(b"<") == "&lt;"
+    assert writer.html(SafeString("<b>")) == "<b>"
+
+    writer = EscapeAllWriter()
+    assert writer.html("<è 💡>") == "&lt;&#232; &#128161;&gt;"
+    assert writer.html(SafeString("<è>")) == "<è>"
+
+
+def test_bytes_writer():
+    writer = BytesWriter()
+    writer.write("foo")
+    writer.write(b"bar")
+    writer.write(1)
+    writer.escape("<à>")
+    assert writer.getvalue() == "foobar1&lt;à&gt;".encode("utf8")
+    writer.reset()
+    assert writer.getvalue() == b""
+
+    writer = EscapeAllBytesWriter()
+    writer.escape("nuvolosità")
+    assert writer.getvalue() == b"nuvolosit&#224;"
+
+    buffer = BytesStreamBuffer()
+    writer = BytesWriter(buffer)
+    writer.write("foo")
+    assert buffer.flush() == b"foo"
+
+
+def test_writer_target():
+    buffer = StreamBuffer()
+    writer = Writer(buffer)
+    writer.write("foo")
+    writer.escape("<")
+    assert buffer.size == 7
+    assert buffer.flush() == "foo&lt;"
+    assert buffer.size == 0
+    assert not writer.body
+
+
+def test_custom_writer():
+    templater = Renoir(writer=UpperWriter)
+    assert templater._render(source="foo{{=a}}", context={"a": "bar"}) == "FOOBAR"
+
+
+def test_writer_pool():
+    pool = WriterPool(Writer, size=1)
+    writer = pool.acquire()
+    writer.write("foo")
+    pool.release(writer)
+    assert pool.acquire() is writer
+    assert not writer.body
+    pool.release(writer)
+    pool.release(Writer())
+    assert len(pool._writers()) == 1
+
+    writers = []
+    thread = threading.Thread(target=lambda: writers.append(pool.acquire()))
+    thread.start()
+    thread.join()
+    assert writers[0] is not writer
+
+
+def test_context_detach():
+    templater = Renoir()
+    context = {"a": 1}
+    assert templater._render(source="{{=a}}", context=context) == "1"
+    assert "__writer__" not in context
+
+
+class CountingTarget:
+    def __init__(self):
+        self.data = []
+
+    def write(self, data):
+        self.data.append(data)
+
+
+def test_write_fusion():
+    templater = Renoir(mode="html")
+    target = CountingTarget()
+    source = "<tr>{{for a, b in rows:}}<td>{{=a}}</td><td>{{=b}}</td>{{pass}}</tr>"
+    templater._write(Writer(target), source, "<fusion>", {"rows": [(1, "<"), (2, ">")]})
+    assert "".join(target.data) == "<tr><td>1</td><td>&lt;</td><td>2</td><td>&gt;</td></tr>"
+    assert len(target.data) == 4
+
+    target = CountingTarget()
+    templater._write(Writer(target), "foo\n{{if True:}}\nbar\n{{pass}}\nbaz", "<fusion-static>", {})
+    assert "".join(target.data) == "foo\nbar\nbaz"
+    assert len(target.data) == 3
+
+
+def test_write_fusion_calls():
+    templater = Renoir(mode="html")
+    source = "{{def foo():}}<b>x</b>{{return '<'}}<td>{{=foo()}}</td>"
+    assert templater._render(source, "<call>") == "<td><b>x</b>&lt;</td>"
+    source = "{{def foo():}}<b>x</b>{{return ''}}<td>{{=a}}{{=foo()}}{{=foo()}}</td>"
+    assert templater._render(source, "<calls>", {"a": 1}) == "<td>1<b>x</b><b>x</b></td>"
+
+
+class BracketsWriter(Writer):
+    __slots__ = []
+
+    def escape(self, data):
+        self.write(f"[{data}]")
+
+
+def test_write_fusion_custom_escape():
+    templater = Renoir(mode="html", writer=BracketsWriter)
+    assert templater._render("{{=a}}", "<value>", {"a": 1}) == "[1]"
+    assert templater._render("x{{=a}}y", "<fused>", {"a": 1}) == "x[1]y"
+
+
+def test_write_fusion_errors():
+    templater = Renoir(debug=True)
+    with pytest.raises(ZeroDivisionError) as exc:
+        templater._render(source="foo<{{=a}}>\n<{{=a}}>{{=1 / 0}}\nbar", context={"a": 1})
+    tb = exc.tb
+    while tb.tb_next:
+        tb = tb.tb_next
+    assert tb.tb_lineno == 2